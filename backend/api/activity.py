@@ -0,0 +1,84 @@
+import asyncio
+import atexit
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .background import DelayedFlush, PeriodicTask
+from .models import Room
+
+"""
+activity.py
+Отложенная запись Room.last_activity.
+Просмотр комнаты (RoomViewSet.retrieve) и события сокета только запоминают время
+в памяти процесса, а в БД оно уходит одним UPDATE на все комнаты раз в FLUSH_INTERVAL
+(не больше одной записи на комнату за интервал). cleanup_rooms видит активность
+с опозданием не больше интервала - при пороге в сутки это не важно.
+Синхронный view (RoomViewSet.retrieve идет в потоке и под daphne) event loop не имеет:
+для него сброс через интервал делает таймер в отдельном потоке.
+"""
+
+FLUSH_INTERVAL = getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 30.0)
+
+_touched = {}  # room_id -> время последней активности
+_lock = threading.Lock()  # touch вызывается и из потоков синхронных view
+_last_flush = time.monotonic()
+
+
+def touch(room_id):
+    """Отмечает активность в комнате. В БД не ходит (кроме редкого сброса пачки из синхронного кода)."""
+    with _lock:
+        _touched[room_id] = timezone.now()
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Синхронный view: сбрасываем сами, если интервал прошел, иначе заводим таймер -
+        # без него последний просмотр тихой комнаты ждал бы следующего запроса или выхода процесса
+        if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            _write(_take_touched())
+        else:
+            _sync_flusher.arm()
+        return
+    _flusher.ensure_running()
+
+
+def _take_touched():
+    global _last_flush
+    with _lock:
+        touched = dict(_touched)
+        _touched.clear()
+        _last_flush = time.monotonic()
+    return touched
+
+
+async def flush():
+    touched = _take_touched()
+    if touched:
+        await database_sync_to_async(_write)(touched)
+
+
+def _write(touched):
+    if not touched:
+        return
+    # Один UPDATE на все комнаты: у каждой свое время через CASE
+    try:
+        Room.objects.filter(id__in=touched).update(last_activity=Case(
+            *[When(id=room_id, then=Value(moment)) for room_id, moment in touched.items()],
+            output_field=DateTimeField(),
+        ))
+    except Exception as e:
+        print(f"🔥 Activity flush error ({len(touched)} rooms): {e}")
+
+
+@atexit.register
+def flush_on_exit():
+    _write(_take_touched())
+
+
+_flusher = PeriodicTask(FLUSH_INTERVAL, flush, name='activity flush')
+_sync_flusher = DelayedFlush(FLUSH_INTERVAL, lambda: _write(_take_touched()), name='activity flush')
@@ -1,27 +1,60 @@
-from django.db.models import Q
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Count, Q
 from rest_framework.views import APIView 
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework import viewsets, permissions
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework import mixins, serializers, status, viewsets, permissions
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
-from .models import Movie, Room, Message, Series, Episode
-from .serializers import MovieSerializer, RoomSerializer, MessageSerializer, FullProfileSerializer, SeriesSerializer
-from django.utils import timezone
+from .models import Movie, Room, Message, Series, Episode, Upload
+from .serializers import (
+    MovieSerializer, RoomSerializer, MessageSerializer, FullProfileSerializer, SeriesSerializer,
+    MovieCardSerializer, RoomCardSerializer, SeriesCardSerializer, UploadSerializer, query_list,
+)
+from .room_cache import notify_room_changed
+from .pagination import MessageKeysetPagination
+from .catalog_cache import CatalogCacheMixin
+from . import activity, blobs, media_pipeline, metrics, rankings, search, uploads, view_counter
+from .fastjson import FastJSONParser
 
 # Класс, который отключает проверку CSRF для API
 class CsrfExemptSessionAuthentication(SessionAuthentication):
     def enforce_csrf(self, request):
         return  # Просто ничего не делаем, пропуская проверку
 
-class MovieViewSet(viewsets.ModelViewSet):
+class MovieViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     API для просмотра и редактирования фильмов.
+    Ответы list/retrieve кэшируются до следующего изменения каталога.
     """
     queryset = Movie.objects.all().order_by('-id')
     serializer_class = MovieSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
+    # В списке есть приватные фильмы автора -> кэш списка у каждого пользователя свой
+    cache_list_per_user = True
+
+    def get_serializer_class(self):
+        # В списке - карточки, полный объект - только по ID
+        if self.action == 'list':
+            return MovieCardSerializer
+        return MovieSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # Считаем только найденный фильм (в т.ч. из кэша или 304): мусорный id не должен
+        # попасть в пачку view_counter.py и уронить ее запись
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            view_counter.record(view_counter.MOVIE, int(kwargs['pk']))
+        return response
+
+    @action(detail=False, methods=['get'])
+    def most_watched(self, request):
+        # Готовая подборка из таблицы Ranking (пересчитывается в фоне, см. rankings.py)
+        movies = rankings.ranked('movie')
+        return Response(MovieCardSerializer(movies, many=True, context={'request': request}).data)
 
     def get_queryset(self):
         # Если запрашивают список (для выпадающего меню)
@@ -39,12 +72,32 @@ class MovieViewSet(viewsets.ModelViewSet):
         # Если запрашивают конкретный фильм по ID (плеер) - отдаем любой
         return Movie.objects.all()
 
-class SeriesViewSet(viewsets.ModelViewSet):
-    queryset = Series.objects.all().order_by('-id')
+class SeriesViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    # Эпизоды вложены в ответ -> подгружаем их одним запросом на весь список
+    queryset = Series.objects.prefetch_related('episodes').order_by('-id')
     serializer_class = SeriesSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
 
+    def get_queryset(self):
+        if self.action == 'list':
+            # В карточке только число эпизодов; сами эпизоды - по ?expand=episodes
+            queryset = Series.objects.annotate(episodes_total=Count('episodes')).order_by('-id')
+            if 'episodes' in query_list(self.request, 'expand'):
+                queryset = queryset.prefetch_related('episodes')
+            return queryset
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SeriesCardSerializer
+        return SeriesSerializer
+
+    @action(detail=False, methods=['get'])
+    def most_watched(self, request):
+        series = rankings.ranked('series', Series.objects.annotate(episodes_total=Count('episodes')))
+        return Response(SeriesCardSerializer(series, many=True, context={'request': request}).data)
+
 class RoomViewSet(viewsets.ModelViewSet):
     queryset = Room.objects.all().order_by('-id') 
     
@@ -54,28 +107,72 @@ class RoomViewSet(viewsets.ModelViewSet):
     lookup_field = 'name'
     
     # Парсеры для приема файлов
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
+
+    def get_queryset(self):
+        # Все, что рисует сериализатор, грузим сразу: список стоит постоянное число запросов
+        queryset = (
+            Room.objects
+            .select_related('owner', 'video', 'active_series', 'active_episode')
+            .annotate(participants_total=Count('participants', distinct=True))
+            .order_by('-id')
+        )
+        # Эпизоды сериала нужны полной комнате и развернутому сериалу в карточке
+        if self.action != 'list' or 'active_series' in query_list(self.request, 'expand'):
+            queryset = queryset.prefetch_related('active_series__episodes')
+        return queryset
+
+    def get_serializer_class(self):
+        # Лобби получает компактные карточки вместо полных комнат с эпизодами
+        if self.action == 'list':
+            return RoomCardSerializer
+        return RoomSerializer
 
     def perform_create(self, serializer):
         user = self.request.user
         data = self.request.data
         video_file = self.request.FILES.get('video_file')
         movie_instance = None
-        
+
+        blob = None
         if video_file:
-            movie_instance = Movie.objects.create(
-                title=f"В комнате: {self.request.data.get('name')}",
-                description="Временное видео",
-                video=video_file,
-                category='A',
-                uploaded_by=self.request.user,
-                is_private=True  # <--- ВАЖНО: Помечаем как скрытый
-            )
-        
-        if movie_instance:
-            serializer.save(owner=self.request.user, video=movie_instance)
-        else:
-            serializer.save(owner=self.request.user)
+            # Тот же фильм, загруженный повторно, на диск второй раз не пишется (blobs.py).
+            # Файл переносится до транзакции: на SQLite она держит блокировку записи всей базы
+            blob = blobs.store_upload(video_file)
+
+        try:
+            with transaction.atomic():
+                # Видео, загруженное частями через /api/uploads/ (см. uploads.py)
+                upload_id = data.get('upload_id')
+                if upload_id and not video_file:
+                    try:
+                        movie_instance = uploads.attach(upload_id, user)
+                    except (uploads.UploadError, ValueError, DjangoValidationError) as e:
+                        message = str(e) if isinstance(e, uploads.UploadError) else 'Загрузка не найдена или не завершена'
+                        raise serializers.ValidationError({'upload_id': message})
+
+                if blob is not None:
+                    movie_instance = Movie.objects.create(
+                        title=f"В комнате: {self.request.data.get('name')}",
+                        description="Временное видео",
+                        video=blob.file.name,
+                        blob=blob,
+                        category='A',
+                        uploaded_by=self.request.user,
+                        is_private=True  # <--- ВАЖНО: Помечаем как скрытый
+                    )
+
+                if movie_instance:
+                    # Нарезка в HLS идет в фоне, до ее готовности комната играет исходный файл
+                    media_pipeline.enqueue('movie', movie_instance)
+                    serializer.save(owner=self.request.user, video=movie_instance)
+                else:
+                    serializer.save(owner=self.request.user)
+        except Exception:
+            # Комната не создалась: ссылка на blob, взятая store_upload, больше не нужна
+            if blob is not None:
+                blobs.release(blob.id)
+            raise
 
         # 2. Выбор Сериала (НОВАЯ ЛОГИКА)
         series_id = data.get('series_id')
@@ -91,16 +188,27 @@ class RoomViewSet(viewsets.ModelViewSet):
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.last_activity = timezone.now()
-        instance.save(update_fields=['last_activity'])
-        return super().retrieve(request, *args, **kwargs)
+        # GET остается чтением: last_activity уйдет в БД пачкой (activity.py)
+        activity.touch(instance.id)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        old_name = serializer.instance.name
+        room = serializer.save()
+        # Сбрасываем кэш комнаты у открытых сокетов (имя могло поменяться)
+        notify_room_changed(old_name)
+        if room.name != old_name:
+            notify_room_changed(room.name)
 
     def perform_destroy(self, instance):
         # Если у комнаты есть видео и оно помечено как приватное -> удаляем видео
         if instance.video and instance.video.is_private:
-            instance.video.delete() # Удалит запись и файл
+            instance.video.delete() # Удалит запись; файл - когда на него не останется ссылок (blobs.py)
         
+        room_name = instance.name
         instance.delete()
+        notify_room_changed(room_name)
 
     # === МЕТОД ПЕРЕКЛЮЧЕНИЯ СЕРИИ ===
     @action(detail=True, methods=['post'])
@@ -119,7 +227,9 @@ class RoomViewSet(viewsets.ModelViewSet):
             
             room.active_episode = episode
             room.save()
-            return Response({'success': True, 'new_url': episode.video.url, 'title': episode.title})
+            notify_room_changed(room.name)
+            new_url = media_pipeline.playlist_url(episode) or episode.video.url
+            return Response({'success': True, 'new_url': new_url, 'title': episode.title})
         except Episode.DoesNotExist:
             return Response({'error': 'Серия не найдена'}, status=404)
 
@@ -134,23 +244,71 @@ class RoomViewSet(viewsets.ModelViewSet):
         
         return Response({'success': True})
 
+class UploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                    viewsets.GenericViewSet):
+    """
+    Докачиваемая загрузка видео частями (протокол описан в uploads.py).
+    Тело PATCH не разбирается парсерами DRF, а потоком пишется на диск.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
+    parser_classes = (FastJSONParser,)
+
+    def get_queryset(self):
+        return Upload.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def partial_update(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Нужны заголовки Upload-Offset и Content-Length'}, status=400)
+
+        try:
+            uploads.append_chunk(upload, offset, request.stream, length)
+        except uploads.UploadError as e:
+            return Response({'error': str(e), 'offset': upload.offset}, status=e.status)
+        return Response(self.get_serializer(upload).data, headers={'Upload-Offset': str(upload.offset)})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            movie = uploads.finalize(upload, request.data.get('checksum', ''), request.data.get('title', ''))
+        except uploads.UploadError as e:
+            return Response({'error': str(e), 'offset': upload.offset}, status=e.status)
+        return Response({**self.get_serializer(upload).data, 'movie': movie.id})
+
+    def perform_destroy(self, instance):
+        uploads.abort(instance)
+        instance.delete()
+
+
 class MessageViewSet(viewsets.ModelViewSet):
     """
     API для сообщений.
-    Позволяет получать сообщения конкретной комнаты.
+    Позволяет получать сообщения конкретной комнаты постранично:
+    /api/messages/?room=<имя> - последние сообщения, ?before=<курсор> - более старые.
     """
     queryset = Message.objects.all() 
 
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
+    pagination_class = MessageKeysetPagination
 
     def get_queryset(self):
         # Получаем параметр room из URL (например: /api/messages/?room=Смотрим кота)
         room_name = self.request.query_params.get('room')
         if room_name:
-            # Ищем сообщения только для этой комнаты
-            return Message.objects.filter(room__name=room_name).order_by('timestamp')
+            # Ищем id комнаты отдельно: дальше фильтр идет по индексу (room, timestamp, id) без JOIN
+            room_id = Room.objects.filter(name=room_name).values_list('id', flat=True).first()
+            return Message.objects.filter(room_id=room_id).select_related('user')
         return Message.objects.none() # Если комнату не указали, ничего не возвращаем
 
     def perform_create(self, serializer):
@@ -174,4 +332,62 @@ class UserProfileView(APIView):
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
-        return Response(serializer.errors, status=400)
\ No newline at end of file
+        return Response(serializer.errors, status=400)
+
+
+class RealtimeStatsView(APIView):
+    """
+    Счетчики realtime-части текущего процесса (отброшенные и склеенные события плеера).
+    Только для администраторов.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+class SearchView(APIView):
+    """
+    Поиск по фильмам и сериалам: /api/search/?q=<слова>&limit=20&offset=0.
+    Слова ищутся по началу ("матр" найдет "Матрица"), результаты - по убыванию релевантности.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        limit, offset = self.get_window(request)
+        rows, has_more = search.search(request.query_params.get('q', ''), request.user, limit, offset)
+
+        # Карточки одним запросом на каждую таблицу
+        movie_ids = [pk for kind, pk, _rank in rows if kind == search.MOVIE]
+        series_ids = [pk for kind, pk, _rank in rows if kind == search.SERIES]
+        context = {'request': request}
+        cards = {
+            (search.MOVIE, card['id']): card
+            for card in MovieCardSerializer(Movie.objects.filter(id__in=movie_ids), many=True, context=context).data
+        }
+        series = Series.objects.filter(id__in=series_ids).annotate(episodes_total=Count('episodes'))
+        cards.update({
+            (search.SERIES, card['id']): card
+            for card in SeriesCardSerializer(series, many=True, context=context).data
+        })
+
+        results = [
+            {'kind': kind, 'rank': rank, **cards[(kind, pk)]}
+            for kind, pk, rank in rows if (kind, pk) in cards
+        ]
+        next_url = None
+        if has_more:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({'next': next_url, 'results': results})
+
+    def get_window(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.page_size))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return self.page_size, 0
+        return max(1, min(limit, self.max_page_size)), max(0, offset)
@@ -1,5 +1,17 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'api'
\ No newline at end of file
+    name = 'api'
+
+    def ready(self):
+        # Регистрируем обработчики сигналов (сброс кэшей)
+        from . import signals  # noqa: F401
+
+        # Временные файлы загрузок лежат в media/ (settings.FILE_UPLOAD_TEMP_DIR), которой может еще не быть.
+        # Здесь, а не в settings.py: импорт настроек не должен трогать диск
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
@@ -0,0 +1,117 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from . import activity, derivatives, fastjson, playback, presence
+from .models import Room
+from .serializers import (
+    room_participants_count, room_poster_name, room_poster_url, room_title, room_video_fallback_url,
+    room_video_url,
+)
+
+"""
+async_views.py
+Самые частые чтения комнаты как нативные async-представления Django.
+Под daphne они выполняются прямо в event loop, без стека DRF и без передачи
+запроса в поток sync_to_async (в поток уходят только сами SQL-запросы async ORM
+и CsrfViewMiddleware.process_view - он в Django только синхронный).
+Для этого вся цепочка MIDDLEWARE должна быть async-совместимой: WhiteNoise заменен
+на api/middleware.py StaticFilesMiddleware.
+Поля считаются теми же функциями, что и в RoomSerializer. Единственное место с файловым IO -
+уменьшенная копия постера (derivatives.py): если ее ссылки нет в LRU, она строится в потоке.
+
+GET /api/rooms/<name>/state/        - что играет, позиция плеера, заполненность
+GET /api/rooms/<name>/participants/ - сколько человек в комнате
+GET /api/rooms/<name>/content/      - ссылка на текущее видео, постер и название
+"""
+
+
+def json_response(data, status=200):
+    return HttpResponse(fastjson.dumps_bytes(data), status=status, content_type='application/json')
+
+
+def not_found():
+    return json_response({'detail': 'Комната не найдена'}, status=404)
+
+
+async def _get_room(name):
+    return await (
+        Room.objects
+        .select_related('owner', 'video', 'active_series', 'active_episode')
+        .annotate(participants_total=Count('participants', distinct=True))
+        .filter(name=name)
+        .afirst()
+    )
+
+
+async def _poster_url(room):
+    name = room_poster_name(room)
+    if not name:
+        return room_poster_url(room)  # внешняя ссылка или None - без файлов
+    url = derivatives.peek(name, 'full')
+    if url is None:
+        # Промах LRU: derivatives.url может читать оригинал и резать копию - не в event loop
+        url = await sync_to_async(derivatives.url)(name, 'full')
+    return url
+
+
+async def _content(room):
+    return {
+        'current_video_url': room_video_url(room),
+        'current_video_fallback_url': room_video_fallback_url(room),
+        'current_poster_url': await _poster_url(room),
+        'current_title': room_title(room) or "Ничего не выбрано",
+        'video': room.video_id,
+        'active_series': room.active_series_id,
+        'active_episode': room.active_episode_id,
+    }
+
+
+@require_GET
+async def room_state(request, name):
+    room = await _get_room(name)
+    if room is None:
+        return not_found()
+    activity.touch(room.id)
+
+    # Позиция из серверных часов, если в этом процессе есть сокеты комнаты, иначе сохраненная
+    clock = playback.authoritative_clock(name)
+    if clock is not None:
+        player = clock.as_sync_data()
+    else:
+        player = {'currentTime': room.current_time, 'paused': True, 'episode_id': room.active_episode_id}
+
+    return json_response({
+        'id': room.id,
+        'name': room.name,
+        'owner_name': room.owner.username,
+        'max_participants': room.max_participants,
+        'participants_count': room_participants_count(room),
+        'is_protected': bool(room.password and room.password.strip()),
+        **(await _content(room)),
+        'player': player,
+    })
+
+
+@require_GET
+async def room_content(request, name):
+    room = await _get_room(name)
+    if room is None:
+        return not_found()
+    return json_response(await _content(room))
+
+
+@require_GET
+async def room_participants(request, name):
+    room = await Room.objects.filter(name=name).only('id').afirst()
+    if room is None:
+        return not_found()
+
+    # Только число: список id и имен синхронные эндпоинты комнаты не отдают, и здесь его нет.
+    # Живое присутствие, если процесс его ведет, иначе сверенная таблица Room.participants
+    count = presence.participants_count(name)
+    if count is None:
+        count = await User.objects.filter(rooms=room).acount()
+    return json_response({'count': count})
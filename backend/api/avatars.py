@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import derivatives
+from .models import UserProfile
+
+"""
+avatars.py
+Единая точка получения ссылок на аватарки (чат в PlayerConsumer и MessageSerializer).
+LRU-кэш по user_id в памяти процесса, сбрасывается сигналами UserProfile (см. signals.py).
+TTL нужен для нескольких нод: сигнал сбрасывает кэш только в своем процессе.
+"""
+
+CACHE_SIZE = getattr(settings, 'AVATAR_CACHE_SIZE', 10000)
+CACHE_TTL = getattr(settings, 'AVATAR_CACHE_TTL', 300)
+
+MISSING = object()  # "нет в кэше" (None - валидное значение: аватарки нет)
+
+_cache = OrderedDict()  # user_id -> (url, expires_at)
+_lock = threading.Lock()
+
+
+def photo_url(name):
+    if not name:
+        return None
+    # Если это заглушка 'default', возвращаем None, чтобы фронт рисовал букву
+    if 'default' in name:
+        return None
+    # В чате аватарка 36px: отдаем квадратную миниатюру, а не исходное фото
+    return derivatives.url(name, 'thumb')
+
+
+def peek(user_id):
+    """Значение из кэша без похода в БД (безопасно вызывать из async кода) или MISSING."""
+    with _lock:
+        item = _cache.get(user_id)
+        if item is None:
+            return MISSING
+        url, expires_at = item
+        if expires_at < time.monotonic():
+            del _cache[user_id]
+            return MISSING
+        _cache.move_to_end(user_id)
+        return url
+
+
+def remember(user_id, url):
+    with _lock:
+        _cache[user_id] = (url, time.monotonic() + CACHE_TTL)
+        _cache.move_to_end(user_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def get_avatar(user_id):
+    return get_avatars([user_id]).get(user_id)
+
+
+def get_avatars(user_ids):
+    """
+    Возвращает {user_id: url или None}.
+    Все промахи кэша добираются одним запросом, сколько бы пользователей ни было.
+    """
+    result = {}
+    missing = set()
+    for user_id in user_ids:
+        url = peek(user_id)
+        if url is MISSING:
+            missing.add(user_id)
+        else:
+            result[user_id] = url
+
+    if missing:
+        photos = dict(
+            UserProfile.objects.filter(user_id__in=missing).values_list('user_id', 'photo')
+        )
+        for user_id in missing:
+            url = photo_url(photos.get(user_id))
+            remember(user_id, url)
+            result[user_id] = url
+    return result
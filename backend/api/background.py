@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from django.db import connections
+
+"""
+background.py
+Периодические фоновые задачи внутри процесса daphne (сброс буферов в БД и т.п.).
+Задача запускается лениво из асинхронного кода, при первом обращении.
+Синхронным view (поток без event loop) вместо нее нужен DelayedFlush.
+"""
+
+
+class PeriodicTask:
+    """Раз в interval секунд вызывает корутину callback() в текущем event loop."""
+
+    def __init__(self, interval, callback, name='task'):
+        self.interval = interval
+        self.callback = callback
+        self.name = name
+        self._task = None
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.callback()
+            except Exception as e:
+                print(f"🔥 Background task '{self.name}' error: {e}")
+
+
+class DelayedFlush:
+    """
+    Для синхронного кода без event loop: через interval секунд один раз вызывает callback()
+    в потоке-таймере. Повторный arm(), пока таймер ждет, ничего не делает.
+    """
+
+    def __init__(self, interval, callback, name='task'):
+        self.interval = interval
+        self.callback = callback
+        self.name = name
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def arm(self):
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(self.interval, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self):
+        try:
+            self.callback()
+        except Exception as e:
+            print(f"🔥 Background task '{self.name}' error: {e}")
+        finally:
+            # Соединение с БД принадлежит потоку таймера - закрываем, чтобы не копились
+            connections.close_all()
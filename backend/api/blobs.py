@@ -0,0 +1,180 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+
+from . import media_pipeline
+from .models import VideoBlob
+
+"""
+blobs.py
+Хранилище загруженных видео по содержимому: media/blobs/ab/<sha256>.<ext>.
+Одинаковый фильм, загруженный в десяток комнат, лежит на диске один раз:
+новый Movie ссылается на существующий VideoBlob, а счетчик ссылок растет.
+Удаление фильма (сигнал post_delete, см. signals.py) счетчик уменьшает, файл
+(и его общая нарезка HLS) удаляется только на нуле.
+
+sha256 считается прямо во время приема файла (Hashing*UploadHandler в FILE_UPLOAD_HANDLERS),
+поэтому повторно читать гигабайты после загрузки не нужно.
+"""
+
+ROOT = 'blobs'
+CHUNK_SIZE = 1024 * 1024
+
+
+# === ХЭШ ВО ВРЕМЯ ЗАГРУЗКИ ===
+
+class HashingMixin:
+    """Считает sha256 тех байт, которые обработчик сохранил, и кладет его в file.sha256."""
+
+    def new_file(self, *args, **kwargs):
+        # До super(): MemoryFileUploadHandler заканчивает new_file исключением StopFutureHandlers
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    def receive_data_chunk(self, raw_data, start):
+        # Маленький файл копится в памяти; большой этот обработчик пропускает дальше
+        if self.activated:
+            self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        # FILE_UPLOAD_TEMP_DIR лежит в MEDIA_ROOT и может еще не существовать
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+# === ХРАНИЛИЩЕ ===
+
+def blob_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if not extension[1:].isalnum() or len(extension) > 6:
+        extension = '.mp4'
+    return f'{ROOT}/{digest[:2]}/{digest}{extension}'
+
+
+def store_upload(uploaded_file):
+    """Сохраняет загруженный файл (UploadedFile) и возвращает его VideoBlob."""
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest is None:
+        # Файл пришел в обход FILE_UPLOAD_HANDLERS
+        digest = hashlib.sha256()
+        for chunk in uploaded_file.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        digest = digest.hexdigest()
+
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Большой файл уже лежит во временном файле на диске - переносим его без копирования
+        return store_path(uploaded_file.temporary_file_path(), digest, uploaded_file.name)
+
+    directory = default_storage.path(ROOT)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            for chunk in uploaded_file.chunks(CHUNK_SIZE):
+                target.write(chunk)
+        return store_path(temp, digest, uploaded_file.name)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def store_path(path, digest, filename):
+    """
+    Забирает локальный файл path с известным sha256 в хранилище.
+    Если такое содержимое уже есть - файл просто удаляется, а счетчик ссылок растет.
+    """
+    # Долгий перенос (копирование, если path на другом диске) - до транзакции: на SQLite она
+    # держит блокировку записи всей базы. Внутри остается только переименование в пределах blobs/
+    staging = stage(path)
+    try:
+        with transaction.atomic():
+            blob = VideoBlob.objects.select_for_update().filter(sha256=digest).first()
+            name = blob.file.name if blob is not None else blob_name(digest, filename)
+            final_path = default_storage.path(name)
+            if blob is not None and os.path.exists(final_path):
+                VideoBlob.objects.filter(id=blob.id).update(ref_count=F('ref_count') + 1)
+                blob.ref_count += 1
+                return blob
+
+            size = os.path.getsize(staging)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(staging, final_path)
+            if blob is not None:
+                # Запись была, а файл пропал с диска: восстанавливаем его из новой загрузки
+                VideoBlob.objects.filter(id=blob.id).update(ref_count=F('ref_count') + 1, size=size)
+                blob.ref_count += 1
+                return blob
+            return VideoBlob.objects.create(sha256=digest, file=name, size=size, ref_count=1)
+    finally:
+        # Дубликат или ошибка: перенесенная копия не нужна
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def stage(path):
+    """Переносит path во временный .part в media/blobs/ (тот же диск, что и итоговый файл)."""
+    directory = default_storage.path(ROOT)
+    # Временные файлы (mkstemp, загрузки Django) создаются с правами 0600 - nginx перед daphne их не прочитал бы
+    os.chmod(path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+    if os.path.dirname(os.path.abspath(path)) == directory:
+        return path
+    os.makedirs(directory, exist_ok=True)
+    fd, staging = tempfile.mkstemp(dir=directory, suffix='.part')
+    os.close(fd)
+    try:
+        # На одном диске (FILE_UPLOAD_TEMP_DIR, UPLOAD_TEMP_DIR в media/) это переименование
+        shutil.move(path, staging)
+    except BaseException:
+        os.remove(staging)
+        raise
+    return staging
+
+
+def release(blob_id):
+    """
+    Минус одна ссылка; на нуле удаляются запись и файл. Возвращает True, если запись удалена.
+    Файл удаляется после коммита: при откате внешней транзакции запись вернется, и файл ей еще нужен.
+    """
+    with transaction.atomic():
+        blob = VideoBlob.objects.select_for_update().filter(id=blob_id).first()
+        if blob is None:
+            return False
+        if blob.ref_count > 1:
+            VideoBlob.objects.filter(id=blob.id).update(ref_count=F('ref_count') - 1)
+            return False
+        name, digest = blob.file.name, blob.sha256
+        blob.delete()
+        transaction.on_commit(lambda: delete_unreferenced(name, digest))
+    return True
+
+
+def delete_unreferenced(name, digest):
+    # Между коммитом и удалением тот же фильм могли загрузить заново - его файлы не трогаем
+    if VideoBlob.objects.filter(sha256=digest).exists():
+        return
+    default_storage.delete(name)
+    # Общая нарезка HLS этого содержимого (media_pipeline.py)
+    shutil.rmtree(default_storage.path(media_pipeline.blob_hls_root(digest)), ignore_errors=True)
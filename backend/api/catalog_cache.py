@@ -0,0 +1,97 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_routers import use_primary
+
+"""
+catalog_cache.py
+Кэш готовых ответов каталога (фильмы, сериалы) в Django cache.
+Ключ включает версию каталога: любое сохранение/удаление Movie, Series или Episode
+(signals.py) увеличивает версию, и все старые ответы перестают находиться.
+Тот же ключ служит ETag: если клиент прислал его в If-None-Match, отвечаем 304
+без обращения к кэшу, БД и сериализатору.
+"""
+
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+VERSION_KEY = 'filmhub:catalog:version'
+
+
+def version():
+    # add() не перезапишет версию, которую уже поставил другой процесс
+    cache.add(VERSION_KEY, 1, timeout=None)
+    return cache.get(VERSION_KEY, 1)
+
+
+def bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Ключа нет (кэш очищен или перезапущен): любая новая версия отличается от старых ключей
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+def response_key(request, endpoint, scope):
+    """Ключ ответа: версия каталога, endpoint, кто смотрит, хост (в ответе абсолютные ссылки) и параметры."""
+    params = '&'.join(f'{name}={value}' for name, value in sorted(request.query_params.items()))
+    raw = f'{version()}|{endpoint}|{scope}|{request.get_host()}|{params}'
+    return 'filmhub:catalog:' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def cached_response(request, endpoint, scope, build):
+    """
+    Отдает ответ из кэша или строит его через build() и кладет в кэш (только 200).
+    scope - кто видит этот ответ одинаково: 'all', 'anon' или 'user:<id>'.
+    """
+    key = response_key(request, endpoint, scope)
+    etag = f'"{key.rsplit(":", 1)[-1]}"'
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        data = cache.get(key)
+        if data is None:
+            # Ответ попадет в кэш под текущей версией каталога: собираем его с основной базы,
+            # иначе отставшая реплика закэширует каталог до изменения
+            with use_primary():
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+
+    response['ETag'] = etag
+    # Ответ зависит от сессии: общие прокси не должны отдавать его другим
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует list/retrieve ViewSet'а каталога.
+    cache_list_per_user = True - список зависит от пользователя (приватные загрузки видны только автору).
+    """
+    cache_list_per_user = False
+
+    def get_cache_scope(self):
+        if self.action == 'list' and self.cache_list_per_user:
+            user = self.request.user
+            return f'user:{user.id}' if user.is_authenticated else 'anon'
+        return 'all'
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, f'{self.basename}-list', self.get_cache_scope(),
+            lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        endpoint = f'{self.basename}-detail:{kwargs.get(self.lookup_url_kwarg or self.lookup_field)}'
+        return cached_response(
+            request, endpoint, self.get_cache_scope(),
+            lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs),
+        )
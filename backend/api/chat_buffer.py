@@ -0,0 +1,77 @@
+import asyncio
+import atexit
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+
+from .background import PeriodicTask
+from .models import Message, Room
+
+"""
+chat_buffer.py
+Отложенная (write-behind) запись сообщений чата.
+PlayerConsumer кладет сообщение в буфер процесса и сразу рассылает его комнате,
+а буфер сохраняется одним bulk_create по достижении размера пачки или по таймеру
+(и при остановке процесса).
+"""
+
+BATCH_SIZE = getattr(settings, 'CHAT_FLUSH_BATCH_SIZE', 100)
+FLUSH_INTERVAL = getattr(settings, 'CHAT_FLUSH_INTERVAL', 1.0)
+
+_pending = []
+_lock = threading.Lock()  # flush_on_exit вызывается вне event loop
+
+
+def add(room_id, user_id, content):
+    """Ставит сообщение в очередь на запись. Не блокирует и не ходит в БД."""
+    with _lock:
+        _pending.append(Message(room_id=room_id, user_id=user_id, content=content))
+        full = len(_pending) >= BATCH_SIZE
+
+    _flusher.ensure_running()
+    if full:
+        asyncio.get_running_loop().create_task(flush())
+
+
+def _take_pending():
+    with _lock:
+        batch = _pending[:]
+        _pending.clear()
+    return batch
+
+
+async def flush():
+    batch = _take_pending()
+    if batch:
+        await _write(batch)
+
+
+@database_sync_to_async
+def _write(batch):
+    _bulk_create(batch)
+
+
+def _bulk_create(batch):
+    # timestamp (auto_now_add) проставится в момент записи пачки - не позже FLUSH_INTERVAL
+    try:
+        try:
+            Message.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+        except IntegrityError:
+            # Комнату удалили, пока сообщения ждали в буфере -> пишем остальные
+            room_ids = {m.room_id for m in batch}
+            alive = set(Room.objects.filter(id__in=room_ids).values_list('id', flat=True))
+            Message.objects.bulk_create([m for m in batch if m.room_id in alive], batch_size=BATCH_SIZE)
+    except Exception as e:
+        print(f"🔥 Chat flush error ({len(batch)} messages lost): {e}")
+
+
+@atexit.register
+def flush_on_exit():
+    batch = _take_pending()
+    if batch:
+        _bulk_create(batch)
+
+
+_flusher = PeriodicTask(FLUSH_INTERVAL, flush, name='chat flush')
@@ -1,49 +1,83 @@
-import json
-import hashlib
+import time
+from functools import partial
 from urllib.parse import unquote
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import Room, Message, UserProfile
+from . import (
+    activity, avatars, chat_buffer, metrics, peers, playback, presence, rankings, room_cache,
+    view_counter, wire,
+)
+from .throttling import TokenBucket, seek_coalescer
 
 class PlayerConsumer(AsyncWebsocketConsumer):
+    codec = wire.JSON
+
     async def connect(self):
         raw_room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_name = unquote(raw_room_name)
-        
-        # Безопасное имя группы
-        safe_group_name = hashlib.md5(self.room_name.encode('utf-8')).hexdigest()
-        self.room_group_name = f'room_{safe_group_name}'
+        self.room_group_name = room_cache.get_room_group_name(self.room_name)
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
         
-        await self.accept()
+        # Формат кадров: JSON по умолчанию или MessagePack, если клиент попросил
+        self.codec, subprotocol = wire.negotiate(self.scope)
+        await self.accept(subprotocol)
+        self.rate_limiter = TokenBucket()
+
+        # Состояние комнаты читается из БД один раз на процесс (см. room_cache)
+        room_state = await room_cache.acquire(self.room_name)
+        if room_state:
+            activity.touch(room_state.room_id)
+
+        # Сразу отдаем новому сокету текущее состояние плеера (вместо опроса всей комнаты), но только
+        # если этот процесс видел живые события: снимок из БД мог устареть (другой процесс, идет play),
+        # и его paused=True остановил бы клиента. Иначе клиент спросит request_sync у остальных участников
+        clock = playback.get_clock(self.room_name, room_state)
+        if clock and clock.authoritative:
+            await self.send_playback_state(clock)
 
         if self.scope["user"].is_authenticated:
-            await self.add_participant(self.room_name, self.scope["user"])
+            # Присутствие держим в памяти, Room.participants сверяется пачкой (presence.py)
+            await presence.ensure_started()
+            if room_state:
+                presence.join(self.room_name, room_state.room_id, self.channel_name, self.scope["user"].id)
             
             # Системное сообщение о входе
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'system_message_event',
-                    'message': f"{self.scope['user'].username} вошел в комнату"
+                    **wire.encode_frame({
+                        'type': 'system',
+                        'message': f"{self.scope['user'].username} вошел в комнату"
+                    }),
+                    # По этим полям все сокеты комнаты запоминают канал участника (peers.py)
+                    'peer': self.scope['user'].username,
+                    'peer_event': 'join',
+                    'sender_channel_name': self.channel_name
                 }
             )
 
     async def disconnect(self, close_code):
+        await self.touch_activity()
         if self.scope["user"].is_authenticated:
-            await self.remove_participant(self.room_name, self.scope["user"])
+            presence.leave(self.room_name, self.channel_name)
             
             # Системное сообщение о выходе
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'system_message_event',
-                    'message': f"{self.scope['user'].username} покинул комнату"
+                    **wire.encode_frame({
+                        'type': 'system',
+                        'message': f"{self.scope['user'].username} покинул комнату"
+                    }),
+                    'peer': self.scope['user'].username,
+                    'peer_event': 'leave',
+                    'sender_channel_name': self.channel_name
                 }
             )
 
@@ -51,12 +85,22 @@ class PlayerConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        if room_cache.release(self.room_name):
+            peers.evict(self.room_name)
+            view_counter.evict(self.room_name)
+            await playback.evict(self.room_name)
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
+            data = wire.decode(text_data, bytes_data)
             event_type = data.get('type')
 
+            # Лимит событий на соединение: лишнее отбрасываем
+            if not self.rate_limiter.allow():
+                metrics.incr('player.dropped')
+                return
+            await self.touch_activity()
+
             # === ИСПРАВЛЕНИЕ ОШИБКИ ===
             # Определяем username СРАЗУ для всех типов событий
             if self.scope["user"].is_authenticated:
@@ -69,18 +113,22 @@ class PlayerConsumer(AsyncWebsocketConsumer):
             # === ЧАТ ===
             if event_type == 'chat_message':
                 message = data.get('message')
-                # Сохраняем
-                await self.save_message(username, message)
+                # Сохраняем (запись в БД отложенная, рассылку не ждет)
+                await self.save_message(message)
                 # Получаем аватарку
-                user_data = await self.get_user_data(username)
+                user_data = await self.get_user_data()
 
                 await self.channel_layer.group_send(
                     self.room_group_name,
                     {
                         'type': 'chat_message_event',
-                        'message': message,
-                        'username': username,
-                        'avatar': user_data['avatar']
+                        # Кадр кодируется один раз здесь, получатели только пересылают его
+                        **wire.encode_frame({
+                            'type': 'chat_message',
+                            'message': message,
+                            'username': username,
+                            'avatar': user_data['avatar']
+                        })
                     }
                 )
 
@@ -91,17 +139,25 @@ class PlayerConsumer(AsyncWebsocketConsumer):
                 # Логирование для отладки
                 print(f"📡 [WS] WebRTC: {event_type} from {username} -> {target if target else 'ALL'}")
 
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'webrtc_signal_event',
+                signal = {
+                    'type': 'webrtc_signal_event',
+                    **wire.encode_frame({
+                        'type': event_type,
                         'sender': username,
-                        'action': event_type,
-                        'data': data,
-                        'target': target,
-                        'sender_channel_name': self.channel_name
-                    }
-                )
+                        'data': data
+                    }),
+                    'target': target,
+                    'peer': self.scope["user"].username if self.scope["user"].is_authenticated else None,
+                    'sender_channel_name': self.channel_name
+                }
+                target_channels = peers.lookup(self.room_name, target) if target else None
+                if target_channels:
+                    # offer/answer/ice адресованы одному участнику -> шлем прямо в его каналы
+                    for channel_name in target_channels:
+                        await self.channel_layer.send(channel_name, signal)
+                else:
+                    # join_voice или адресат пока неизвестен -> вся комната
+                    await self.channel_layer.group_send(self.room_group_name, signal)
 
             # === МОДЕРАЦИЯ (КИК) ===
             elif event_type == 'kick_user':
@@ -113,55 +169,105 @@ class PlayerConsumer(AsyncWebsocketConsumer):
                         self.room_group_name,
                         {
                             'type': 'kick_event',
-                            'kicked_username': target_username
+                            **wire.encode_frame({
+                                'type': 'user_kicked',
+                                'kicked_username': target_username
+                            })
                         }
                     )
 
             # === ВИДЕО (СИНХРОНИЗАЦИЯ) ===
+            elif event_type == 'request_sync' and playback.authoritative_clock(self.room_name):
+                # Сервер знает состояние плеера -> отвечаем только этому сокету
+                await self.send_playback_state(playback.authoritative_clock(self.room_name))
+
             elif event_type in ['play', 'pause', 'seek', 'sync', 'change_video', 'request_sync', 'response_sync']:
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
+                video_event = {
+                    'type': 'video_event',
+                    **wire.encode_frame({
                         'type': 'video_event',
                         'action': event_type,
-                        'payload': data,
-                        'sender_channel_name': self.channel_name
-                    }
-                )
+                        'data': data
+                    }),
+                    # action/payload/ts нужны получателям для серверных часов плеера
+                    'action': event_type,
+                    'payload': data,
+                    'ts': time.time(),
+                    'sender_channel_name': self.channel_name
+                }
+                send = partial(self.channel_layer.group_send, self.room_group_name)
+
+                if event_type == 'play':
+                    # Просмотр засчитывается один раз на фильм/серию в комнате (view_counter.py)
+                    view_counter.record_room_play(self.room_name, await room_cache.get_room_state(self.room_name))
+                    rankings.ensure_running()
+
+                if event_type in ('seek', 'sync'):
+                    # Серию перемоток склеиваем: комната получит только последнюю позицию окна
+                    await seek_coalescer.submit(self.room_group_name, video_event, send)
+                else:
+                    # Отложенная перемотка должна уйти раньше play/pause
+                    await seek_coalescer.flush(self.room_group_name)
+                    await send(video_event)
         except Exception as e:
             print(f"🔥 WS Error in receive: {e}")
 
     # === ОТПРАВЩИКИ СОБЫТИЙ ===
 
+    async def send_frame(self, event):
+        # Кадр кодируется один раз на процесс и формат (wire.encoded)
+        if self.codec == wire.MSGPACK:
+            await self.send(bytes_data=wire.encoded(event, wire.MSGPACK))
+        else:
+            await self.send(text_data=wire.encoded(event, wire.JSON))
+
     async def chat_message_event(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': event['message'],
-            'username': event['username'],
-            'avatar': event.get('avatar')
-        }))
+        await self.send_frame(event)
 
     async def system_message_event(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'system',
-            'message': event['message']
-        }))
+        if event.get('peer_event') == 'join':
+            peers.register(self.room_name, event['peer'], event['sender_channel_name'])
+        elif event.get('peer_event') == 'leave':
+            peers.unregister(self.room_name, event['peer'], event['sender_channel_name'])
+
+        await self.send_frame(event)
 
     async def video_event(self, event):
+        # Событие получает каждый сокет комнаты (на всех нодах); применение идемпотентно
+        await self.update_clock(event)
+
         if self.channel_name != event.get('sender_channel_name'):
-            await self.send(text_data=json.dumps({
-                'type': 'video_event',
-                'action': event['action'],
-                'data': event['payload']
-            }))
+            await self.send_frame(event)
 
     async def kick_event(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_kicked',
-            'kicked_username': event['kicked_username']
+        await self.send_frame(event)
+
+    async def send_playback_state(self, clock):
+        await self.send_frame(wire.encode_frame({
+            'type': 'video_event',
+            'action': 'response_sync',
+            'data': clock.as_sync_data()
         }))
 
+    async def update_clock(self, event):
+        room_state = await room_cache.get_room_state(self.room_name)
+        clock = playback.get_clock(self.room_name, room_state)
+        if clock is None:
+            return
+        ts = event.get('ts', time.time())
+        if event['action'] == 'change_video':
+            clock.reset(room_state.active_episode_id, ts)
+        elif event['action'] != 'request_sync':
+            clock.apply(event['action'], event['payload'], ts)
+
+    async def room_changed_event(self, event):
+        # Комнату изменили через API -> перечитаем её при следующем обращении
+        room_cache.invalidate(self.room_name)
+
     async def webrtc_signal_event(self, event):
+        # Запоминаем канал отправителя, чтобы ответить ему напрямую
+        peers.register(self.room_name, event.get('peer'), event.get('sender_channel_name'))
+
         # Не отправляем самому себе
         if self.channel_name == event.get('sender_channel_name'):
             return
@@ -170,56 +276,33 @@ class PlayerConsumer(AsyncWebsocketConsumer):
         if target and target != self.scope['user'].username:
             return
 
-        await self.send(text_data=json.dumps({
-            'type': event['action'],
-            'sender': event['sender'],
-            'data': event['data']
-        }))
+        await self.send_frame(event)
 
     # === РАБОТА С БД ===
 
-    @database_sync_to_async
-    def get_user_data(self, username):
-        try:
-            user = User.objects.get(username=username)
-            if hasattr(user, 'user_profile') and user.user_profile.photo:
-                url = user.user_profile.photo.url
-                if 'default' in url: return {'avatar': None}
-                return {'avatar': url}
-        except Exception:
-            pass
-        return {'avatar': None}
-
-    @database_sync_to_async
-    def add_participant(self, room_name, user):
-        try:
-            room = Room.objects.get(name=room_name)
-            room.participants.add(user)
-        except Room.DoesNotExist:
-            pass
+    async def get_user_data(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            return {'avatar': None}
+        # Обычно аватарка уже в кэше -> обходимся без перехода в поток БД
+        avatar = avatars.peek(user.id)
+        if avatar is avatars.MISSING:
+            avatar = await database_sync_to_async(avatars.get_avatar)(user.id)
+        return {'avatar': avatar}
 
-    @database_sync_to_async
-    def remove_participant(self, room_name, user):
-        try:
-            room = Room.objects.get(name=room_name)
-            room.participants.remove(user)
-        except Room.DoesNotExist:
-            pass
+    async def save_message(self, content):
+        # Сохраняем только сообщения авторизованных: id берем из scope, без запросов к БД
+        user = self.scope["user"]
+        state = await room_cache.get_room_state(self.room_name)
+        if state and user.is_authenticated and content:
+            chat_buffer.add(state.room_id, user.id, content)
 
-    @database_sync_to_async
-    def save_message(self, username, content):
-        try:
-            user = User.objects.filter(username=username).first()
-            room = Room.objects.filter(name=self.room_name).first()
-            if user and room:
-                Message.objects.create(user=user, room=room, content=content)
-        except Exception:
-            pass
-
-    @database_sync_to_async
-    def check_is_owner(self, username):
-        try:
-            room = Room.objects.get(name=self.room_name)
-            return room.owner.username == username
-        except Exception:
-            return False
\ No newline at end of file
+    async def touch_activity(self):
+        # last_activity пишется пачкой раз в интервал (activity.py), здесь только отметка в памяти
+        state = await room_cache.get_room_state(self.room_name)
+        if state:
+            activity.touch(state.room_id)
+
+    async def check_is_owner(self, username):
+        state = await room_cache.get_room_state(self.room_name)
+        return state is not None and state.owner_username == username
\ No newline at end of file
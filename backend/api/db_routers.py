@@ -0,0 +1,55 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.db import connections
+
+from .models import Episode, Message, Movie, Ranking, Series
+
+"""
+db_routers.py
+Чтение каталога и истории чата - с реплики, все остальное (и любые записи) - с основной базы.
+Подключается в settings.py, только если задан POSTGRES_REPLICA_HOST.
+Реплика может отставать на доли секунды: только что отправленное сообщение
+появится в истории чуть позже (в комнате оно и так приходит по сокету).
+
+Где отставание недопустимо, чтения идут с основной базы:
+- внутри транзакции (читаем то, что сами только что записали);
+- весь запрос с изменяющим методом (POST/PUT/PATCH/DELETE), см. api/middleware.py PrimaryDatabaseMiddleware;
+- заполнение кэша каталога (catalog_cache.py): устаревший ответ с реплики остался бы в кэше
+  под новой версией каталога до CACHE_TIMEOUT.
+"""
+
+REPLICA = 'replica'
+REPLICA_MODELS = (Movie, Series, Episode, Message, Ranking)
+
+# contextvars, а не threading.local: значение переходит и в поток sync_to_async, и в async-представления
+_pinned = contextvars.ContextVar('filmhub_db_pinned', default=False)
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока - с основной базы."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not issubclass(model, REPLICA_MODELS):
+            return 'default'
+        if _pinned.get() or connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Обе базы содержат одни и те же данные
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
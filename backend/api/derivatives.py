@@ -0,0 +1,161 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import ImageDigest
+
+"""
+derivatives.py
+Уменьшенные копии постеров и аватарок (Pillow) вместо оригиналов в полный размер.
+
+thumb - квадрат для аватарок в чате, card - постер в списках, full - страница фильма и плеер.
+Файл лежит по адресу из хэша содержимого оригинала: derivatives/ab/<sha256>-<вариант>.webp,
+поэтому одинаковые картинки режутся один раз, а ссылку можно кэшировать в браузере навсегда.
+Копии создаются при сохранении модели (signals.py) или при первом запросе ссылки.
+Ссылки по имени оригинала держит LRU-кэш процесса, как в avatars.py, а за ним - Django cache
+(имя оригинала -> имя копии, без срока): хранилище не перезаписывает файлы под тем же именем,
+поэтому sha256 оригинала читается один раз, а не при каждом промахе LRU.
+Тот же sha256 сохраняется в БД (ImageDigest): sweep_media по нему находит живые копии.
+"""
+
+# вариант -> (ширина, высота, обрезать до точного размера)
+VARIANTS = getattr(settings, 'IMAGE_VARIANTS', {
+    'thumb': (72, 72, True),      # аватарка 36px, x2 для retina
+    'card': (400, 600, False),
+    'full': (1280, 1280, False),
+})
+QUALITY = getattr(settings, 'IMAGE_QUALITY', 80)
+CACHE_SIZE = getattr(settings, 'IMAGE_URL_CACHE_SIZE', 20000)
+CACHE_TTL = getattr(settings, 'IMAGE_URL_CACHE_TTL', 3600)
+
+# WebP, если Pillow собран с libwebp; иначе JPEG
+if features.check('webp'):
+    FORMAT, EXTENSION, SAVE_OPTIONS = 'WEBP', 'webp', {'quality': QUALITY, 'method': 4}
+else:
+    FORMAT, EXTENSION, SAVE_OPTIONS = 'JPEG', 'jpg', {'quality': QUALITY, 'optimize': True, 'progressive': True}
+
+ROOT = 'derivatives'
+
+_cache = OrderedDict()  # (имя оригинала, вариант) -> (url, expires_at)
+_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'IMAGE_DERIVATIVES', True)
+
+
+def url(name, variant):
+    """Ссылка на вариант картинки. Если сделать его нельзя (нет файла, не картинка) - ссылка на оригинал."""
+    if not name:
+        return None
+    # Заглушки отдаем как есть: фронт узнает их по 'default' в ссылке
+    if not enabled() or os.path.basename(name).startswith('default'):
+        return default_storage.url(name)
+
+    key = (name, variant)
+    with _lock:
+        item = _cache.get(key)
+        if item is not None and item[1] >= time.monotonic():
+            _cache.move_to_end(key)
+            return item[0]
+
+    # Проверяем только наличие копии (ее могли удалить вместе с media/), оригинал не читаем
+    target = cache.get(_cache_key(name, variant))
+    if target is None or not default_storage.exists(target):
+        try:
+            target = ensure(name, variant)
+        except (OSError, Image.DecompressionBombError) as e:
+            print(f"❌ Derivative {variant} for {name}: {e}")
+            return default_storage.url(name)
+        cache.set(_cache_key(name, variant), target, None)
+    result = default_storage.url(target)
+
+    with _lock:
+        _cache[key] = (result, time.monotonic() + CACHE_TTL)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def peek(name, variant):
+    """Ссылка из LRU без обращения к файлам (безопасно вызывать из async кода) или None."""
+    if not enabled() or os.path.basename(name).startswith('default'):
+        return default_storage.url(name)
+    with _lock:
+        item = _cache.get((name, variant))
+        if item is not None and item[1] >= time.monotonic():
+            _cache.move_to_end((name, variant))
+            return item[0]
+    return None
+
+
+def warm(name, variants):
+    """Создает варианты сразу после загрузки, чтобы первый зритель не ждал."""
+    for variant in variants:
+        url(name, variant)
+
+
+def forget(name):
+    with _lock:
+        for key in [key for key in _cache if key[0] == name]:
+            del _cache[key]
+    cache.delete_many([_cache_key(name, variant) for variant in VARIANTS])
+
+
+def _cache_key(name, variant):
+    return f"filmhub:derivative:{variant}:{hashlib.md5(name.encode('utf-8')).hexdigest()}"
+
+
+def derivative_name(digest, variant):
+    return f'{ROOT}/{digest[:2]}/{digest}-{variant}.{EXTENSION}'
+
+
+def remember_digest(name, digest):
+    """Запоминает sha256 оригинала для sweep_media (media_sweeper.live_digests)."""
+    ImageDigest.objects.update_or_create(name=name, defaults={'sha256': digest})
+
+
+def ensure(name, variant):
+    """Имя файла варианта в хранилище; режет картинку, если такого содержимого еще не было."""
+    width, height, crop = VARIANTS[variant]
+    with default_storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()
+    remember_digest(name, digest)
+    target = derivative_name(digest, variant)
+    path = default_storage.path(target)
+    if os.path.exists(path):
+        return target
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        # Палитру и прочие режимы приводим к RGB(A) до масштабирования: так работает сглаживание
+        transparent = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent and FORMAT == 'WEBP' else 'RGB')
+        if crop:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image.thumbnail((width, height), Image.LANCZOS)  # без увеличения маленьких
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Через временный файл: параллельный запрос увидит либо готовую картинку, либо никакой
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                image.save(output, FORMAT, **SAVE_OPTIONS)
+            # mkstemp создает файл с правами 0600 - веб-сервер перед daphne его бы не прочитал
+            os.chmod(temp, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+    return target
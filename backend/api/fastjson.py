@@ -0,0 +1,65 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него работает стандартный json
+    orjson = None
+
+"""
+fastjson.py
+Единый быстрый JSON для REST API и кадров WebSocket.
+Если установлен orjson, кодируем и разбираем им, иначе - стандартным json
+с теми же настройками, что у DRF (UTF-8 без экранирования, компактные разделители).
+Типы, которых orjson не знает (Decimal, ленивые строки и т.п.), отдаются
+кодировщику DRF.
+"""
+
+_drf_encoder = JSONEncoder()
+
+
+def dumps_bytes(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_drf_encoder.default)
+    return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj):
+    """Строка для текстового кадра WebSocket."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_drf_encoder.default).decode('utf-8')
+    return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson. С отступами (browsable API, ?indent) - обычный рендер DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_drf_encoder.default)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
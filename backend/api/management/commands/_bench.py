@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.backends import utils as db_utils
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+"""
+Общие помощники для команд bench_* (модуль с "_" Django не считает командой).
+"""
+
+
+@contextmanager
+def temporary_database():
+    """
+    Бенчмарки работают на временной тестовой БД, рабочую базу не трогаем.
+    Воркеры нарезки HLS не запускаются: замеры не должны делить базу с фоновыми потоками.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(MEDIA_WORKERS=0):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+class QueryCounter:
+    """Считает SQL-запросы во всех потоках (database_sync_to_async ходит в БД не из главного)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._execute = db_utils.CursorWrapper.execute
+        self._executemany = db_utils.CursorWrapper.executemany
+        counter = self
+
+        def execute(cursor, *args, **kwargs):
+            with counter._lock:
+                counter.count += 1
+            return counter._execute(cursor, *args, **kwargs)
+
+        def executemany(cursor, *args, **kwargs):
+            with counter._lock:
+                counter.count += 1
+            return counter._executemany(cursor, *args, **kwargs)
+
+        db_utils.CursorWrapper.execute = execute
+        db_utils.CursorWrapper.executemany = executemany
+        return self
+
+    def __exit__(self, *exc_info):
+        db_utils.CursorWrapper.execute = self._execute
+        db_utils.CursorWrapper.executemany = self._executemany
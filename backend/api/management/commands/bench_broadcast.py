@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import wire
+from api.consumers import PlayerConsumer
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарк: CPU на одну рассылку кадра комнате в зависимости от числа участников'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='2,10,50,200', help='Размеры комнат через запятую')
+        parser.add_argument('--iterations', type=int, default=2000, help='Рассылок на каждый размер')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        iterations = options['iterations']
+
+        self.stdout.write(f"{'участников':>11} {'было, мкс':>11} {'стало, мкс':>11} {'ускорение':>10}")
+        for size in sizes:
+            before = asyncio.run(self.measure(size, iterations, encode_once=False))
+            after = asyncio.run(self.measure(size, iterations, encode_once=True))
+            self.stdout.write(f'{size:>11} {before:>11.1f} {after:>11.1f} {before / after:>9.1f}x')
+
+        self.stdout.write(self.style.SUCCESS('Готово (время CPU процесса на одну рассылку).'))
+
+    async def measure(self, size, iterations, encode_once):
+        consumers = [self.make_consumer(i) for i in range(size)]
+        payload = {'type': 'chat_message', 'message': 'Смотрим дальше? ' * 4, 'username': 'viewer'}
+
+        started = time.process_time()
+        for _ in range(iterations):
+            if encode_once:
+                # Текущая схема: кадр кодируется один раз на процесс, остальные получатели пересылают строку
+                event = {'type': 'chat_message_event', **wire.encode_frame({**payload, 'avatar': None})}
+                for consumer in consumers:
+                    await consumer.chat_message_event(event)
+            else:
+                # Прежняя схема: каждый получатель собирает dict и вызывает json.dumps сам
+                event = {'type': 'chat_message_event', 'message': payload['message'],
+                         'username': payload['username'], 'avatar': None}
+                for consumer in consumers:
+                    await consumer.send(text_data=json.dumps({
+                        'type': 'chat_message',
+                        'message': event['message'],
+                        'username': event['username'],
+                        'avatar': event.get('avatar')
+                    }))
+        elapsed = time.process_time() - started
+        return elapsed / iterations * 1_000_000
+
+    @staticmethod
+    def make_consumer(index):
+        consumer = PlayerConsumer()
+        consumer.channel_name = f'bench.{index}'
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            pass
+
+        consumer.send = send
+        return consumer
@@ -0,0 +1,112 @@
+import io
+import os
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import avatars
+from api.models import Message, Movie, Room, Series, UserProfile
+
+from ._bench import temporary_database
+from .bench_payloads import seed_catalog
+
+CHAT_ROOM = 'bench-chat'
+
+# (название, адрес, параметры, поле со ссылкой на картинку)
+PAGES = (
+    ('лобби', '/api/rooms/', {}, 'video_poster'),
+    ('история чата', '/api/messages/', {'room': CHAT_ROOM}, 'user_avatar'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Байты на страницу лобби и страницу истории чата (JSON + все картинки, на которые он ссылается): '
+        'оригиналы постеров и аватарок против уменьшенных копий из api/derivatives.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=30, help='Комнат в лобби (у каждой свой постер)')
+        parser.add_argument('--users', type=int, default=30, help='Авторов сообщений (у каждого свое фото)')
+        parser.add_argument('--messages', type=int, default=50, help='Сообщений в истории')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media, temporary_database(), \
+                override_settings(MEDIA_ROOT=media, IMAGE_DERIVATIVES=False):
+            owner = User.objects.create_user('bench_owner')
+            seed(owner, options)
+            client = APIClient()
+            client.force_authenticate(owner)
+
+            rows = [('оригиналы', measure(client))]
+            with override_settings(IMAGE_DERIVATIVES=True):
+                avatars._cache.clear()
+                rows.append(('копии, первый запрос', measure(client)))
+                avatars._cache.clear()
+                rows.append(('копии, повторно', measure(client)))
+
+        self.stdout.write(f"{'':>22} {'страница':>14} {'JSON, байт':>11} {'картинок':>9} "
+                          f"{'картинки, байт':>15} {'время, мс':>10}")
+        for label, pages in rows:
+            for page, (json_bytes, images, image_bytes, elapsed) in pages.items():
+                self.stdout.write(f'{label:>22} {page:>14} {json_bytes:>11} {images:>9} '
+                                  f'{image_bytes:>15} {elapsed * 1000:>10.1f}')
+
+
+def seed(owner, options):
+    seed_catalog(owner, options['rooms'], episodes=1)
+    for i, movie in enumerate(Movie.objects.all()):
+        movie.image.save(f'poster_{i}.jpg', ContentFile(sample_jpeg((2000, 3000), i)))
+    for i, series in enumerate(Series.objects.all()):
+        series.image.save(f'series_{i}.jpg', ContentFile(sample_jpeg((2000, 3000), i + 1000)))
+
+    room = Room.objects.create(name=CHAT_ROOM, owner=owner)
+    authors = []
+    for i in range(options['users']):
+        user = User.objects.create_user(f'bench_user_{i}')
+        profile = UserProfile.objects.create(user=user)
+        profile.photo.save(f'photo_{i}.jpg', ContentFile(sample_jpeg((1024, 1024), i + 2000)))
+        authors.append(user)
+    Message.objects.bulk_create(
+        Message(room=room, user=authors[i % len(authors)], content=f'Сообщение {i}')
+        for i in range(options['messages'])
+    )
+
+
+def sample_jpeg(size, seed_value):
+    """Фото-подобная картинка: градиент с шумом, как у реальных постеров, плохо сжимается."""
+    width, height = size
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 20 + seed_value % 30)
+    image = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.FLIP_TOP_BOTTOM)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def measure(client):
+    """{страница: (байт JSON, картинок, байт картинок, время ответа)}"""
+    result = {}
+    for page, url, params, field in PAGES:
+        started = time.perf_counter()
+        response = client.get(url, params)
+        elapsed = time.perf_counter() - started
+        data = response.json()
+        items = data['results'] if isinstance(data, dict) else data
+        # Одна и та же картинка браузером качается один раз
+        links = {item[field] for item in items if item.get(field)}
+        result[page] = (len(response.content), len(links), sum(map(media_size, links)), elapsed)
+    return result
+
+
+def media_size(url):
+    path = urlparse(url).path
+    return os.path.getsize(os.path.join(settings.MEDIA_ROOT, path[len(settings.MEDIA_URL):]))
@@ -0,0 +1,81 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import fastjson
+from api.models import Message, Movie, Room
+from api.serializers import MessageSerializer, MovieCardSerializer, RoomSerializer
+
+from ._bench import temporary_database
+from .bench_payloads import seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Скорость JSON на реальных ответах: комната с сериалом, каталог фильмов, страница чата '
+        'и кадр плеера. Сравнивает стандартный json (как в DRF) с orjson из api/fastjson.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Повторов на каждый замер')
+        parser.add_argument('--catalog', type=int, default=100, help='Фильмов (и комнат) в каталоге')
+
+    def handle(self, *args, **options):
+        if fastjson.orjson is None:
+            raise CommandError('orjson не установлен: сравнивать не с чем (pip install orjson)')
+
+        with temporary_database():
+            payloads = build_payloads(options['catalog'])
+
+        stdlib = JSONRenderer()
+        self.stdout.write(
+            f"{'данные':>8} {'байт':>8} {'json enc':>10} {'orjson enc':>11} {'json dec':>10} {'orjson dec':>11}  (мкс)"
+        )
+        for name, data in payloads:
+            encoded = stdlib.render(data)
+            timings = (
+                measure(lambda: stdlib.render(data), options['repeat']),
+                measure(lambda: fastjson.dumps_bytes(data), options['repeat']),
+                measure(lambda: json.loads(encoded), options['repeat']),
+                measure(lambda: fastjson.loads(encoded), options['repeat']),
+            )
+            self.stdout.write(
+                f'{name:>8} {len(encoded):>8} ' + ' '.join(f'{value:>10.1f}' for value in timings)
+            )
+
+
+def build_payloads(size):
+    user = User.objects.create_user('bench_owner')
+    seed_catalog(user, size, episodes=24)
+    request = Request(APIRequestFactory().get('/api/'))
+    context = {'request': request}
+
+    room = Room.objects.exclude(active_series=None).first()
+    Message.objects.bulk_create(
+        Message(room=room, user=user, content=f'Сообщение номер {i} 🎬') for i in range(50)
+    )
+    frame = {
+        'type': 'video_event',
+        'action': 'seek',
+        'data': {'type': 'seek', 'currentTime': 1234.567, 'username': user.username},
+    }
+    return (
+        ('room', RoomSerializer(room, context=context).data),
+        ('catalog', MovieCardSerializer(Movie.objects.all(), many=True, context=context).data),
+        ('chat', MessageSerializer(Message.objects.select_related('user'), many=True, context=context).data),
+        ('frame', frame),
+    )
+
+
+def measure(func, repeat):
+    """Среднее время одного вызова в микросекундах."""
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
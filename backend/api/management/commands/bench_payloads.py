@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.models import Episode, Movie, Room, Series
+from api.serializers import MovieSerializer, RoomSerializer, SeriesSerializer
+
+from ._bench import temporary_database
+
+# Полные объекты, которые списки отдавали раньше
+FULL = (
+    ('rooms (полные)', RoomSerializer, Room),
+    ('movies (полные)', MovieSerializer, Movie),
+    ('series (полные)', SeriesSerializer, Series),
+)
+
+# (название, адрес, параметры): ответы списков как их видит клиент
+REQUESTS = (
+    ('rooms', '/api/rooms/', {}),
+    ('rooms ?expand', '/api/rooms/', {'expand': 'video,active_series,active_episode'}),
+    ('rooms ?fields', '/api/rooms/', {'fields': 'name,owner_name,participants_count'}),
+    ('movies', '/api/movies/', {}),
+    ('series', '/api/series/', {}),
+    ('series ?expand', '/api/series/', {'expand': 'episodes'}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Размер ответов списков API на заполненном каталоге: полные объекты против карточек '
+        'по умолчанию, развернутых через ?expand= вложенных объектов и выборки полей ?fields=.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=50, help='Комнат (и столько же фильмов и сериалов)')
+        parser.add_argument('--episodes', type=int, default=24, help='Эпизодов в каждом сериале')
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user = User.objects.create_user('bench_owner')
+            seed_catalog(user, options['rooms'], options['episodes'])
+            client = APIClient()
+            client.force_authenticate(user)
+            request = Request(APIRequestFactory().get('/api/'))
+            sizes = [
+                (name, len(JSONRenderer().render(
+                    serializer_class(model.objects.all(), many=True, context={'request': request}).data
+                )))
+                for name, serializer_class, model in FULL
+            ]
+            sizes += [(name, len(client.get(url, params).content)) for name, url, params in REQUESTS]
+
+        self.stdout.write(f"{'запрос':>18} {'байт':>10} {'байт/объект':>12}")
+        for name, size in sizes:
+            self.stdout.write(f"{name:>18} {size:>10} {size // options['rooms']:>12}")
+
+
+def seed_catalog(user, count, episodes):
+    for i in range(count):
+        movie = Movie.objects.create(title=f'Фильм {i}', description='Описание фильма. ' * 20, uploaded_by=user)
+        series = Series.objects.create(title=f'Сериал {i}', description='Описание сериала. ' * 20)
+        Episode.objects.bulk_create(
+            Episode(series=series, number=n, title=f'Серия {n}', video=f'episodes/{i}_{n}.mp4')
+            for n in range(1, episodes + 1)
+        )
+        first_episode = series.episodes.order_by('number').first()
+        Room.objects.create(name=f'Комната {i}', owner=user, video=movie if i % 2 else None,
+                            active_series=None if i % 2 else series,
+                            active_episode=None if i % 2 else first_episode)
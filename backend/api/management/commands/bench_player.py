@@ -0,0 +1,219 @@
+import asyncio
+import contextlib
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from urllib.parse import parse_qs, quote
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api import chat_buffer
+from api.models import Room
+from api.routing import websocket_urlpatterns
+
+from ._bench import QueryCounter, temporary_database
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+# Доли событий в смеси (примерно как в живой комнате с голосовым чатом)
+EVENT_MIX = (
+    ('chat_message', 0.25),
+    ('play', 0.05),
+    ('pause', 0.05),
+    ('seek', 0.15),
+    ('webrtc_ice_candidate', 0.40),
+    ('webrtc_offer', 0.05),
+    ('join_voice', 0.05),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный бенчмарк PlayerConsumer: R комнат x M клиентов на InMemoryChannelLayer. '
+        'Выводит JSON с задержками доставки, событиями/с, запросами к БД на событие и памятью на соединение.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=5)
+        parser.add_argument('--clients', type=int, default=10, help='Клиентов в каждой комнате')
+        parser.add_argument('--events', type=int, default=50, help='Событий от каждого клиента')
+        parser.add_argument('--rate', type=float, default=5.0, help='Событий в секунду от одного клиента')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию stdout; отладочный вывод консьюмера идет в stderr)')
+
+    def handle(self, *args, **options):
+        # Отладочные print() консьюмера уходят в stderr: в stdout только JSON (bench_player > run.json)
+        with temporary_database(), override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER), \
+                contextlib.redirect_stdout(sys.stderr):
+            report = asyncio.run(self.run(options))
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Отчет записан в {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    async def run(self, options):
+        rng = random.Random(options['seed'])
+        rooms = await database_sync_to_async(seed_rooms)(options['rooms'], options['clients'])
+        app = ScopeUserMiddleware(URLRouter(websocket_urlpatterns))
+
+        # Память на соединение: разница до и после подключения всех клиентов
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        clients = []
+        for room_name, usernames in rooms.items():
+            for username in usernames:
+                client = BenchClient(app, room_name, username, usernames)
+                await client.connect()
+                clients.append(client)
+        memory_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        await asyncio.sleep(0.2)  # системные сообщения о входе не учитываем
+        for client in clients:
+            client.latencies.clear()
+
+        with QueryCounter() as queries:
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                client.play_script(options['events'], options['rate'], random.Random(rng.random()))
+                for client in clients
+            ))
+            await asyncio.sleep(1.0)  # ждем хвост доставки (в т.ч. склейку seek)
+            elapsed = time.perf_counter() - started
+            await chat_buffer.flush()
+
+        for client in clients:
+            await client.close()
+
+        sent = sum(client.sent for client in clients)
+        latencies = [value for client in clients for values in client.latencies.values() for value in values]
+        per_type = {}
+        for client in clients:
+            for event_type, values in client.latencies.items():
+                per_type.setdefault(event_type, []).extend(values)
+
+        return {
+            'rooms': options['rooms'],
+            'clients_per_room': options['clients'],
+            'events_sent': sent,
+            'frames_delivered': len(latencies),
+            'events_per_sec': round(sent / elapsed, 1),
+            'frames_per_sec': round(len(latencies) / elapsed, 1),
+            'latency_ms': percentiles(latencies),
+            'latency_ms_by_type': {name: percentiles(values) for name, values in sorted(per_type.items())},
+            'db_queries_per_event': round(queries.count / sent, 3) if sent else 0,
+            'memory_per_connection_kb': round((memory_after - memory_before) / len(clients) / 1024, 1),
+        }
+
+
+def seed_rooms(room_count, client_count):
+    rooms = {}
+    for r in range(room_count):
+        usernames = [f'bench_{r}_{c}' for c in range(client_count)]
+        users = [User.objects.create_user(username) for username in usernames]
+        Room.objects.create(name=f'Бенчмарк {r}', owner=users[0])
+        rooms[f'Бенчмарк {r}'] = usernames
+    return rooms
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    ordered = sorted(values)
+    cuts = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        'p50': round(cuts[49] * 1000, 2),
+        'p95': round(cuts[94] * 1000, 2),
+        'p99': round(cuts[98] * 1000, 2),
+    }
+
+
+class ScopeUserMiddleware:
+    """Подставляет пользователя из ?user= вместо сессии (у бенчмарка нет кук)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        username = parse_qs(scope.get('query_string', b'').decode()).get('user', [None])[0]
+        user = AnonymousUser()
+        if username:
+            user = await database_sync_to_async(User.objects.get)(username=username)
+        return await self.app(dict(scope, user=user), receive, send)
+
+
+class BenchClient:
+    def __init__(self, app, room_name, username, room_users):
+        self.username = username
+        self.peers = [name for name in room_users if name != username]
+        self.communicator = WebsocketCommunicator(app, f'/ws/player/{quote(room_name)}/?user={username}')
+        self.latencies = {}
+        self.sent = 0
+        self.reader = None
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        assert connected, f'{self.username} не подключился'
+        self.reader = asyncio.get_running_loop().create_task(self.read())
+
+    async def read(self):
+        # receive_output() при таймауте убивает приложение, поэтому читаем очередь напрямую
+        queue = self.communicator.output_queue
+        while True:
+            message = await queue.get()
+            if message.get('type') != 'websocket.send' or 'text' not in message:
+                continue
+            received = time.perf_counter()
+            frame = json.loads(message['text'])
+            sent_at = find_timestamp(frame)
+            if sent_at is not None:
+                event_type = frame.get('action') if frame['type'] == 'video_event' else frame['type']
+                self.latencies.setdefault(event_type, []).append(received - sent_at)
+
+    async def play_script(self, count, rate, rng):
+        names, weights = zip(*EVENT_MIX)
+        position = 0.0
+        for _ in range(count):
+            await asyncio.sleep(rng.expovariate(rate))
+            event_type = rng.choices(names, weights)[0]
+            now = time.perf_counter()
+            position += rng.uniform(0, 5)
+            if event_type == 'chat_message':
+                event = {'type': event_type, 'message': f'bench:{now}'}
+            elif event_type.startswith('webrtc'):
+                event = {
+                    'type': event_type,
+                    'target': rng.choice(self.peers) if self.peers else None,
+                    'data': {'candidate': {'candidate': 'candidate:1 1 udp 2122260223 10.0.0.1 50000 typ host'}},
+                    'bench_ts': now,
+                }
+            else:
+                event = {'type': event_type, 'currentTime': position, 'bench_ts': now}
+            await self.communicator.send_to(text_data=json.dumps(event))
+            self.sent += 1
+
+    async def close(self):
+        self.reader.cancel()
+        await self.communicator.disconnect()
+
+
+def find_timestamp(frame):
+    if frame.get('type') == 'chat_message':
+        message = frame.get('message') or ''
+        return float(message[6:]) if message.startswith('bench:') else None
+    data = frame.get('data')
+    if isinstance(data, dict):
+        return data.get('bench_ts')
+    return None
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import Episode, Message, Movie, Room, Series
+
+from ._bench import temporary_database
+
+# Списки, число запросов которых не должно зависеть от количества записей
+ENDPOINTS = (
+    ('rooms', '/api/rooms/', {}),
+    ('movies', '/api/movies/', {}),
+    ('series', '/api/series/', {}),
+    ('messages', '/api/messages/', {'room': 'Комната 0'}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Бюджет SQL-запросов на списки API: сравнивает число запросов на маленьком и большом каталоге. '
+        'Завершается с ошибкой, если запросов становится больше с ростом данных (N+1).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--small', type=int, default=3, help='Записей каждого вида в маленьком каталоге')
+        parser.add_argument('--large', type=int, default=30, help='Записей каждого вида в большом каталоге')
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user = User.objects.create_user('bench_owner')
+            seed_catalog(user, options['small'])
+            small = count_queries(user)
+            seed_catalog(user, options['large'] - options['small'], offset=options['small'])
+            large = count_queries(user)
+
+        failed = []
+        self.stdout.write(f"{'список':>10} {options['small']:>8} {options['large']:>8}")
+        for name, _url, _params in ENDPOINTS:
+            self.stdout.write(f'{name:>10} {small[name]:>8} {large[name]:>8}')
+            if large[name] > small[name]:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Число запросов растет вместе с данными: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS('Число запросов не зависит от размера каталога.'))
+
+
+def seed_catalog(user, count, offset=0):
+    for i in range(offset, offset + count):
+        movie = Movie.objects.create(title=f'Фильм {i}', description='...', uploaded_by=user)
+        series = Series.objects.create(title=f'Сериал {i}', description='...')
+        episodes = [
+            Episode.objects.create(series=series, number=n, title=f'Серия {n}', video=f'episodes/{i}_{n}.mp4')
+            for n in range(1, 4)
+        ]
+        room = Room.objects.create(name=f'Комната {i}', owner=user, video=movie if i % 2 else None,
+                                   active_series=None if i % 2 else series,
+                                   active_episode=None if i % 2 else episodes[0])
+        room.participants.add(user)
+        Message.objects.create(room=Room.objects.get(name='Комната 0'), user=user, content=f'Сообщение {i}')
+
+
+def count_queries(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    counts = {}
+    for name, url, params in ENDPOINTS:
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: HTTP {response.status_code}')
+        counts[name] = len(queries)
+    return counts
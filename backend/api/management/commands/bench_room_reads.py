@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+
+from api.models import Room
+
+from ._bench import temporary_database
+from .bench_payloads import seed_catalog
+from .bench_player import percentiles
+
+# Тестовый клиент искажает не-ASCII в пути, поэтому у комнаты латинское имя
+ROOM_NAME = 'bench-room'
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность чтения комнаты через ASGI при C одновременных запросах: '
+        'RoomViewSet.retrieve (синхронный DRF) против async-представлений state/content/participants.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на каждый адрес')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременных запросов')
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user = User.objects.create_user('bench_owner')
+            seed_catalog(user, 10, episodes=24)
+            room = Room.objects.filter(active_series__isnull=False).first()
+            room.name = ROOM_NAME
+            room.save()
+            room.participants.add(user)
+
+            base = f'/api/rooms/{ROOM_NAME}/'
+            targets = (
+                ('retrieve (DRF)', base),
+                ('state (async)', base + 'state/'),
+                ('content (async)', base + 'content/'),
+                ('participants (async)', base + 'participants/'),
+            )
+            report = {
+                name: asyncio.run(run(url, options['requests'], options['concurrency']))
+                for name, url in targets
+            }
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Отчет записан в {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+
+async def run(url, total, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    await one()  # прогрев (импорты, кэши)
+    latencies.clear()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests_per_sec': round(total / elapsed, 1),
+        'latency_ms': percentiles(latencies),
+        'errors': errors,
+    }
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+
+from .bench_player import percentiles
+
+# Профили соединения: как было (настройки SQLite по умолчанию) и как в settings.SQLITE_OPTIONS
+PROFILES = {
+    'default': {},
+    'tuned': settings.SQLITE_OPTIONS,
+}
+
+SCHEMA = (
+    'CREATE TABLE message (id INTEGER PRIMARY KEY, room_id INTEGER, content TEXT, ts REAL)',
+    'CREATE INDEX message_room_ts ON message (room_id, ts, id)',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузка на файл SQLite: R потоков читают историю чата, W потоков пишут сообщения. '
+        'Сравнивает настройки SQLite по умолчанию с профилем из settings (WAL, synchronous=NORMAL, '
+        'busy_timeout, mmap). Соединения открываются через бэкенд Django, как в приложении.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Длительность каждого прогона')
+        parser.add_argument('--rows', type=int, default=20000, help='Сообщений в базе перед прогоном')
+        parser.add_argument('--output', help='Куда записать JSON (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        report = {}
+        for name, extra in PROFILES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                report[name] = run_profile(path, extra, options)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Отчет записан в {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+
+def run_profile(path, extra, options):
+    # Свой ConnectionHandler: у каждого потока свое соединение, как у потоков daphne
+    handler = ConnectionHandler({'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': dict(extra),
+    }})
+    seed(handler['default'], options['rows'])
+    handler['default'].close()
+
+    stop = threading.Event()
+    results = {'read': [], 'write': [], 'errors': 0}
+    lock = threading.Lock()
+
+    def worker(kind, number):
+        connection = handler['default']
+        own = []
+        errors = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with connection.cursor() as cursor:
+                    if kind == 'read':
+                        cursor.execute(
+                            'SELECT id, content, ts FROM message WHERE room_id = %s ORDER BY ts DESC, id DESC LIMIT 50',
+                            [number % 10],
+                        )
+                        cursor.fetchall()
+                    else:
+                        cursor.execute(
+                            'INSERT INTO message (room_id, content, ts) VALUES (%s, %s, %s)',
+                            [number % 10, 'bench', time.time()],
+                        )
+            except OperationalError:
+                errors += 1  # "database is locked"
+                continue
+            own.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            results[kind].extend(own)
+            results['errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=('read', i)) for i in range(options['readers'])]
+    threads += [threading.Thread(target=worker, args=('write', i)) for i in range(options['writers'])]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(options['seconds'])
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'reads_per_sec': round(len(results['read']) / elapsed, 1),
+        'writes_per_sec': round(len(results['write']) / elapsed, 1),
+        'read_latency_ms': percentiles(results['read']),
+        'write_latency_ms': percentiles(results['write']),
+        'write_latency_max_ms': round(max(results['write'], default=0) * 1000, 2),
+        'locked_errors': results['errors'],
+    }
+
+
+def seed(connection, rows):
+    with connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        cursor.executemany(
+            'INSERT INTO message (room_id, content, ts) VALUES (%s, %s, %s)',
+            [(i % 10, f'Сообщение {i}', float(i)) for i in range(rows)],
+        )
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import resource
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Movie
+
+from ._bench import temporary_database
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка большого разреженного файла через /api/uploads/ частями с замером RSS процесса. '
+        'Падает с ошибкой, если память растет вместе с размером файла.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-gb', type=float, default=2.0, help='Размер файла (ГБ)')
+        parser.add_argument('--chunk-mb', type=int, default=16, help='Размер одной части (МБ)')
+        parser.add_argument('--rss-limit-mb', type=int, default=64,
+                            help='Допустимый рост RSS сверх одной части за всю загрузку (МБ)')
+
+    def handle(self, *args, **options):
+        size = int(options['size_gb'] * 1024 ** 3)
+        chunk_size = options['chunk_mb'] * MB
+
+        with tempfile.TemporaryDirectory() as media, temporary_database(), \
+                override_settings(MEDIA_ROOT=media, UPLOAD_TEMP_DIR=os.path.join(media, 'uploads')):
+            source = os.path.join(media, 'source.bin')
+            with open(source, 'wb') as f:
+                f.truncate(size)  # разреженный файл: место на диске не занимает
+
+            user = User.objects.create_user('bench_owner')
+            client = APIClient()
+            client.force_login(user)
+            session = client.cookies['sessionid'].value
+            response = client.post('/api/uploads/', {'filename': 'big.mp4', 'size': size}, format='json')
+            if response.status_code != 201:
+                raise CommandError(f'Создание загрузки: HTTP {response.status_code} {response.data}')
+            url = f"/api/uploads/{response.data['id']}/"
+            checksum = file_sha256(source)
+
+            # Части идут через WSGIHandler с телом-потоком из файла, как от сервера:
+            # тестовый клиент сам держит тело запроса в памяти и исказил бы замер
+            handler = WSGIHandler()
+            started = time.perf_counter()
+            baseline = None
+            peak = 0
+            with open(source, 'rb') as f:
+                offset = 0
+                while offset < size:
+                    f.seek(offset)
+                    length = min(chunk_size, size - offset)
+                    status, body = patch_chunk(handler, url, f, offset, length, session)
+                    if status != 200:
+                        raise CommandError(f'Часть с offset {offset}: HTTP {status} {body}')
+                    offset = body['offset']
+                    rss = current_rss()
+                    # Базой считаем RSS после первой части: в нем уже все импорты и буферы
+                    baseline = rss if baseline is None else baseline
+                    peak = max(peak, rss)
+            upload_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = client.post(url + 'finalize/', {'checksum': checksum}, format='json')
+            finalize_seconds = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'finalize: HTTP {response.status_code} {response.data}')
+            peak = max(peak, current_rss())
+            movie = Movie.objects.get(id=response.data['movie'])
+            stored = os.path.getsize(movie.video.path)
+
+        growth = (peak - baseline) / MB
+        self.stdout.write(f'Файл: {size / 1024 ** 3:.2f} ГБ частями по {options["chunk_mb"]} МБ, сохранено {stored} байт')
+        self.stdout.write(f'Загрузка: {upload_seconds:.1f} с ({size / MB / upload_seconds:.0f} МБ/с), '
+                          f'finalize (sha256 + перенос): {finalize_seconds:.1f} с')
+        self.stdout.write(f'RSS после первой части: {baseline / MB:.0f} МБ, пик: {peak / MB:.0f} МБ, рост: {growth:.1f} МБ')
+        if stored != size:
+            raise CommandError('Размер сохраненного файла не совпал с исходным')
+        if growth > options['rss_limit_mb']:
+            raise CommandError(f'RSS вырос на {growth:.0f} МБ - память зависит от размера файла')
+        self.stdout.write(self.style.SUCCESS('Память не зависит от размера файла.'))
+
+
+def patch_chunk(handler, url, stream, offset, length, session):
+    environ = {
+        'REQUEST_METHOD': 'PATCH',
+        'PATH_INFO': url,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': stream,
+        'CONTENT_LENGTH': str(length),
+        'CONTENT_TYPE': 'application/offset+octet-stream',
+        'HTTP_UPLOAD_OFFSET': str(offset),
+        'HTTP_COOKIE': f'sessionid={session}',
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    body = b''.join(response)
+    response.close()
+    return int(statuses[0].split()[0]), json.loads(body)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(MB), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах (Linux), иначе пиковый из getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
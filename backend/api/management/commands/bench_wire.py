@@ -0,0 +1,115 @@
+import json
+import random
+import time
+
+import msgpack
+from django.core.management.base import BaseCommand
+
+from api import fastjson, wire
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение JSON (fastjson, как шлет сервер) и MessagePack для кадров плеера: '
+        'размер и скорость на трассе событий, плюс полная цена рассылки кадра (wire.encode_frame + wire.encoded)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trace', help='JSONL-файл с записанными событиями (см. PLAYER_TRACE_PATH)')
+        parser.add_argument('--events', type=int, default=20000, help='Размер синтетической трассы, если --trace не задан')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз прогонять трассу для замера скорости')
+
+    def handle(self, *args, **options):
+        if options['trace']:
+            with open(options['trace'], encoding='utf-8') as trace:
+                events = [json.loads(line) for line in trace if line.strip()]
+        else:
+            events = synthetic_trace(options['events'])
+
+        # Кадры в том виде, в каком сервер рассылает их клиентам
+        frames = [server_frame(event) for event in events]
+
+        # Кодеки те же, что у PlayerConsumer: текстовый кадр - fastjson (orjson, если есть),
+        # бинарный - msgpack, разбор входящих - wire.decode
+        results = {}
+        for name, encode, size, decode in (
+            ('json', fastjson.dumps, lambda text: len(text.encode('utf-8')), lambda text: wire.decode(text_data=text)),
+            ('msgpack', lambda f: msgpack.packb(f, use_bin_type=True), len, lambda data: wire.decode(bytes_data=data)),
+            # Реальная цена рассылки в комнату, где все клиенты на JSON: событие + один encoded() на процесс
+            ('broadcast', lambda f: wire.encoded(wire.encode_frame(f), wire.JSON), None, None),
+        ):
+            encoded = [encode(frame) for frame in frames]
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for frame in frames:
+                    encode(frame)
+            encode_rate = len(frames) * options['repeat'] / (time.perf_counter() - started)
+
+            decode_rate = None
+            if decode is not None:
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    for data in encoded:
+                        decode(data)
+                decode_rate = len(frames) * options['repeat'] / (time.perf_counter() - started)
+
+            results[name] = {
+                'bytes': sum(map(size, encoded)) if size else None,
+                'encode_per_sec': encode_rate,
+                'decode_per_sec': decode_rate,
+            }
+
+        self.stdout.write(f'Событий в трассе: {len(frames)}')
+        self.stdout.write(f"{'формат':>12} {'байт':>12} {'байт/кадр':>10} {'encode/с':>12} {'decode/с':>12}")
+        for name, row in results.items():
+            size_columns = (f"{row['bytes']:>12} {row['bytes'] / len(frames):>10.1f}"
+                            if row['bytes'] is not None else f"{'-':>12} {'-':>10}")
+            decode_column = f"{row['decode_per_sec']:>12.0f}" if row['decode_per_sec'] is not None else f"{'-':>12}"
+            self.stdout.write(f"{name:>12} {size_columns} {row['encode_per_sec']:>12.0f} {decode_column}")
+        ratio = results['msgpack']['bytes'] / results['json']['bytes']
+        self.stdout.write(self.style.SUCCESS(f'MessagePack занимает {ratio:.0%} от объема JSON.'))
+
+
+def server_frame(event):
+    event_type = event.get('type')
+    if event_type in ('webrtc_offer', 'webrtc_answer', 'webrtc_ice_candidate', 'join_voice'):
+        return {'type': event_type, 'sender': event.get('username', 'viewer'), 'data': event}
+    if event_type == 'chat_message':
+        return {'type': 'chat_message', 'message': event.get('message'), 'username': 'viewer', 'avatar': None}
+    return {'type': 'video_event', 'action': event_type, 'data': event}
+
+
+def synthetic_trace(count, seed=42):
+    """Смесь событий большой комнаты: в основном ICE и синхронизация, немного чата и SDP."""
+    rng = random.Random(seed)
+    events = []
+    position = 0.0
+    for _ in range(count):
+        roll = rng.random()
+        position += rng.uniform(0, 2)
+        if roll < 0.45:
+            events.append({
+                'type': 'webrtc_ice_candidate',
+                'target': f'user{rng.randint(1, 50)}',
+                'data': {'candidate': {
+                    'candidate': (
+                        f'candidate:{rng.randint(10**8, 10**9)} 1 udp {rng.randint(10**9, 2 * 10**9)} '
+                        f'192.168.{rng.randint(0, 255)}.{rng.randint(1, 254)} {rng.randint(1024, 65535)} '
+                        f'typ host generation 0 ufrag {rng.getrandbits(16):04x} network-cost 999'
+                    ),
+                    'sdpMid': '0',
+                    'sdpMLineIndex': 0,
+                }},
+            })
+        elif roll < 0.80:
+            events.append({'type': rng.choice(['seek', 'sync', 'play', 'pause']), 'currentTime': round(position, 3)})
+        elif roll < 0.95:
+            events.append({'type': 'chat_message', 'message': 'Смотрим дальше? ' * rng.randint(1, 4)})
+        else:
+            sdp = '\r\n'.join(f'a=candidate:{i} 1 udp 2122260223 10.0.0.{i} 5{i:04d} typ host' for i in range(30))
+            events.append({
+                'type': rng.choice(['webrtc_offer', 'webrtc_answer']),
+                'target': f'user{rng.randint(1, 50)}',
+                'data': {'offer': {'type': 'offer', 'sdp': sdp}},
+            })
+    return events
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from api import uploads
 from api.models import Room
 from datetime import timedelta
 
@@ -19,8 +20,13 @@ class Command(BaseCommand):
             # Срабатывает логика perform_destroy (удаление видео), если вызывать delete() у модели
             # Но perform_destroy это метод ViewSet.
             # Поэтому здесь удаляем видео вручную, если оно приватное
+            # (файл общий для одинаковых загрузок и удалится с последней ссылкой, см. api/blobs.py)
             if room.video and room.video.is_private:
                 room.video.delete()
             room.delete()
 
-        self.stdout.write(self.style.SUCCESS(f'Успешно удалено {count} заброшенных комнат.'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Успешно удалено {count} заброшенных комнат.'))
+
+        # Брошенные недокачанные загрузки (UPLOAD_EXPIRY) вместе с их .part
+        expired = uploads.expire_stale()
+        self.stdout.write(self.style.SUCCESS(f'Удалено просроченных загрузок: {expired}.'))
\ No newline at end of file
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import media_pipeline
+from api.models import MediaJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Нарезает загруженные фильмы и серии в HLS (очередь MediaJob). '
+        'По умолчанию работает постоянно; с --once разбирает очередь и выходит.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Потоков нарезки (по умолчанию MEDIA_WORKERS)')
+        parser.add_argument('--once', action='store_true', help='Обработать текущую очередь и выйти')
+        parser.add_argument('--scan', action='store_true', help='Поставить в очередь все файлы без задачи')
+        parser.add_argument('--retry-failed', action='store_true', help='Повторить упавшие задачи')
+
+    def handle(self, *args, **options):
+        if options['scan']:
+            self.stdout.write(f'Поставлено в очередь: {media_pipeline.enqueue_missing()}')
+        if options['retry_failed']:
+            self.stdout.write(f'Повторно в очереди: {media_pipeline.retry_failed()}')
+
+        if options['once']:
+            processed = media_pipeline.drain()
+            failed = MediaJob.objects.filter(status='failed').count()
+            self.stdout.write(self.style.SUCCESS(f'Обработано задач: {processed}, упавших в очереди: {failed}'))
+            return
+
+        workers = media_pipeline.start_workers(options['workers'] or max(1, media_pipeline.configured_workers()))
+        self.stdout.write(self.style.SUCCESS(f'Воркеров нарезки: {len(workers)}. Ctrl+C для остановки'))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает индекс полнотекстового поиска (SQLite FTS5) по фильмам и сериалам'
+
+    def handle(self, *args, **kwargs):
+        if not search.use_fts():
+            self.stdout.write('Эта база ищет через tsvector, отдельный индекс не нужен.')
+            return
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано объектов: {count}'))
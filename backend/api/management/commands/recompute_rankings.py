@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import rankings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает подборки каталога ("Most Watched") в таблицу Ranking'
+
+    def handle(self, *args, **kwargs):
+        count = rankings.recompute()
+        self.stdout.write(self.style.SUCCESS(f'Позиций в подборках: {count}'))
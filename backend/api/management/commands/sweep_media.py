@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import media_sweeper
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Ищет в MEDIA_ROOT файлы, на которые не ссылается ни одна запись (фильмы, серии, аватарки, '
+        'загрузки, нарезки HLS, уменьшенные копии), и показывает занятое место по папкам. '
+        'Без --delete/--quarantine ничего не трогает.'
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--delete', action='store_true', help='Удалить найденные файлы')
+        action.add_argument('--quarantine', action='store_true',
+                            help='Перенести найденные файлы в MEDIA_QUARANTINE_DIR/<дата>/')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Не трогать файлы моложе N секунд (идущие загрузки и нарезки)')
+        parser.add_argument('--batch-size', type=int, default=media_sweeper.BATCH_SIZE,
+                            help='Сколько путей сверять с БД за раз')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Повторять каждые N секунд (0 - один проход, для cron)')
+
+    def handle(self, *args, **options):
+        action = 'delete' if options['delete'] else 'quarantine' if options['quarantine'] else 'report'
+        while True:
+            sweeper = media_sweeper.Sweeper(action, options['min_age'], options['batch_size'])
+            started = time.perf_counter()
+            usage = sweeper.run()
+            self.report(usage, sweeper, time.perf_counter() - started)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def report(self, usage, sweeper, elapsed):
+        self.stdout.write(f"{'папка':>16} {'файлов':>9} {'МБ':>10} {'сирот':>7} {'МБ сирот':>10}")
+        totals = [0, 0, 0, 0]
+        for directory, row in sorted(usage.items(), key=lambda item: -item[1][1]):
+            self.stdout.write(f'{directory:>16} {row[0]:>9} {row[1] / MB:>10.1f} {row[2]:>7} {row[3] / MB:>10.1f}')
+            totals = [total + value for total, value in zip(totals, row)]
+        self.stdout.write(f"{'всего':>16} {totals[0]:>9} {totals[1] / MB:>10.1f} {totals[2]:>7} {totals[3] / MB:>10.1f}")
+
+        if sweeper.action == 'report':
+            message = f'Найдено сирот: {totals[2]} ({totals[3] / MB:.1f} МБ). Удалить: --delete или --quarantine'
+        elif sweeper.action == 'quarantine':
+            message = f'Перенесено в {sweeper.quarantine}: {sweeper.removed}'
+        else:
+            message = f'Удалено файлов: {sweeper.removed}'
+        self.stdout.write(self.style.SUCCESS(f'{message} ({elapsed:.1f} с)'))
@@ -0,0 +1,324 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import Episode, MediaJob, Movie
+
+"""
+media_pipeline.py
+Фоновая нарезка загруженных видео в HLS (несколько качеств по HLS_RENDITIONS).
+
+1. enqueue() ставит фильм или серию в очередь - таблица MediaJob, поэтому после
+   перезапуска процесса работа продолжается с того же места;
+2. воркеры (MEDIA_WORKERS потоков в процессе daphne или отдельный процесс
+   manage.py process_media) забирают задачи атомарным UPDATE и режут файл локальным ffmpeg;
+3. результат кладется в media/hls/<kind>/<id>/<версия>/master.m3u8, а у модели
+   выставляются hls_status='ready' и hls_playlist. Пока нарезки нет (или ffmpeg упал),
+   плеер получает исходный mp4.
+Фильм из общего хранилища (Movie.blob, см. blobs.py) режется в media/hls/blob/ab/<sha256>/:
+одинаковое видео в десятке комнат нарезается один раз, остальные фильмы берут готовый плейлист.
+Эта папка удаляется вместе с последней ссылкой на blob.
+"""
+
+MODELS = {'movie': Movie, 'episode': Episode}
+
+FFMPEG_BINARY = getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+JOB_TIMEOUT = getattr(settings, 'MEDIA_JOB_TIMEOUT', 6 * 3600)
+MAX_ATTEMPTS = getattr(settings, 'MEDIA_JOB_ATTEMPTS', 3)
+RENDITIONS = getattr(settings, 'HLS_RENDITIONS', (('360p', 360, '800k', '96k'), ('720p', 720, '2800k', '128k')))
+SEGMENT_SECONDS = getattr(settings, 'HLS_SEGMENT_SECONDS', 6)
+
+# Без новых задач воркер заглядывает в очередь редко: enqueue будит его сам
+IDLE_POLL_INTERVAL = 60.0
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+class MediaError(Exception):
+    pass
+
+
+def hls_root(kind, object_id):
+    """Папка нарезок объекта относительно MEDIA_ROOT."""
+    return os.path.join('hls', kind, str(object_id))
+
+
+def blob_hls_root(digest):
+    """Общая нарезка одного содержимого (VideoBlob) относительно MEDIA_ROOT."""
+    return os.path.join('hls', 'blob', digest[:2], digest)
+
+
+def playlist_url(item):
+    """URL master.m3u8, если нарезка готова, иначе None."""
+    if item.hls_status == 'ready' and item.hls_playlist:
+        return default_storage.url(item.hls_playlist)
+    return None
+
+
+# === ОЧЕРЕДЬ ===
+
+def enqueue(kind, item):
+    """
+    Ставит фильм/серию в очередь, если у нее есть файл и нарезка из этого файла еще не заказана.
+    Повторное сохранение без замены файла новой задачи не создает.
+    """
+    if not item.video:
+        return None
+    source = item.video.name
+    job, created = MediaJob.objects.get_or_create(kind=kind, object_id=item.id, defaults={'source': source})
+    if not created:
+        if job.source == source:
+            return job
+        # Файл заменили: старая нарезка больше не подходит, режем заново
+        MediaJob.objects.filter(id=job.id).update(
+            source=source, status='queued', attempts=0, error='', started_at=None, finished_at=None,
+        )
+    # update(), а не save(): сигналы модели (и повторный enqueue) здесь не нужны
+    MODELS[kind].objects.filter(id=item.id).update(hls_status='pending', hls_playlist='')
+    item.hls_status, item.hls_playlist = 'pending', ''
+
+    if configured_workers() > 0:
+        transaction.on_commit(start_workers)
+    return job
+
+
+def enqueue_missing():
+    """Ставит в очередь все загруженные файлы, для которых задачи еще нет. Возвращает их число."""
+    count = 0
+    for kind, model in MODELS.items():
+        known = MediaJob.objects.filter(kind=kind).values('object_id')
+        items = model.objects.using('default').exclude(Q(video='') | Q(video__isnull=True)).exclude(id__in=known)
+        for item in items.only('id', 'video').iterator():
+            enqueue(kind, item)
+            count += 1
+    return count
+
+
+def retry_failed():
+    failed = MediaJob.objects.filter(status='failed')
+    for kind, model in MODELS.items():
+        model.objects.filter(id__in=failed.filter(kind=kind).values('object_id')).update(hls_status='pending')
+    return failed.update(status='queued', attempts=0, error='', started_at=None, finished_at=None)
+
+
+def discard(kind, object_id):
+    """Объект удален: убираем задачу и все его нарезки."""
+    MediaJob.objects.filter(kind=kind, object_id=object_id).delete()
+    shutil.rmtree(default_storage.path(hls_root(kind, object_id)), ignore_errors=True)
+
+
+def claim():
+    """
+    Забирает следующую задачу. Ставить status='running' можно только если строка не изменилась
+    с момента чтения - так одну задачу не возьмут два воркера (и два процесса).
+    Зависшие дольше JOB_TIMEOUT (процесс упал посреди нарезки) забираются повторно.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=JOB_TIMEOUT)
+    candidates = (
+        MediaJob.objects
+        .filter(Q(status='queued') | Q(status='running', started_at__lt=stale))
+        .order_by('id')
+        .values_list('id', 'status', 'started_at')[:10]
+    )
+    for job_id, status, started_at in candidates:
+        claimed = MediaJob.objects.filter(id=job_id, status=status, started_at=started_at).update(
+            status='running', started_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return MediaJob.objects.get(id=job_id)
+    return None
+
+
+# === ВОРКЕРЫ ===
+
+def configured_workers():
+    return getattr(settings, 'MEDIA_WORKERS', 1)
+
+
+def start_workers(count=None):
+    """Дозапускает потоки-воркеры до count (по умолчанию MEDIA_WORKERS) и будит их."""
+    count = configured_workers() if count is None else count
+    with _workers_lock:
+        _workers[:] = [thread for thread in _workers if thread.is_alive()]
+        while len(_workers) < count:
+            thread = threading.Thread(target=worker_loop, name=f'media-worker-{len(_workers)}', daemon=True)
+            thread.start()
+            _workers.append(thread)
+    _wakeup.set()
+    return list(_workers)
+
+
+def worker_loop():
+    while True:
+        job = None
+        try:
+            close_old_connections()
+            job = claim()
+            if job is not None:
+                process(job)
+        except Exception as e:
+            # Поток не должен умирать: задача, которую не удалось закрыть, вернется через JOB_TIMEOUT
+            print(f"🔥 Media worker error: {e}")
+        if job is None:
+            _wakeup.wait(IDLE_POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def drain():
+    """Обрабатывает очередь в текущем потоке до опустошения. Возвращает число задач."""
+    processed = 0
+    while (job := claim()) is not None:
+        process(job)
+        processed += 1
+    return processed
+
+
+# === НАРЕЗКА ===
+
+def process(job):
+    model = MODELS[job.kind]
+    # Воркер читает только с основной базы: реплика может еще не видеть только что загруженный файл
+    items = model.objects.using('default').filter(id=job.object_id)
+    if job.kind == 'movie':
+        items = items.select_related('blob').only('id', 'video', 'blob__sha256')
+    else:
+        items = items.only('id', 'video')
+    item = items.first()
+    if item is None:
+        discard(job.kind, job.object_id)
+        return
+    if not item.video or item.video.name != job.source:
+        # Файл заменили в обход enqueue (например, в админке): перезаказываем или снимаем задачу
+        if enqueue(job.kind, item) is None:
+            discard(job.kind, job.object_id)
+        return
+    if job.attempts > MAX_ATTEMPTS:
+        _finish_failed(job, model, job.error or 'Превышено число попыток')
+        return
+
+    blob = getattr(item, 'blob', None)
+    if blob is not None:
+        version = None
+        output = blob_hls_root(blob.sha256)
+    else:
+        version = f"{hashlib.md5(job.source.encode()).hexdigest()[:8]}-{job.attempts}"
+        output = os.path.join(hls_root(job.kind, job.object_id), version)
+    model.objects.filter(id=item.id).update(hls_status='processing')
+    try:
+        # Общую нарезку мог уже сделать фильм с тем же содержимым
+        if blob is None or not default_storage.exists(os.path.join(output, 'master.m3u8')):
+            segment(item.video.path, default_storage.path(output))
+    except MediaError as e:
+        print(f"❌ HLS {job.kind} {job.object_id}: {e}")
+        if job.attempts >= MAX_ATTEMPTS:
+            _finish_failed(job, model, str(e))
+        else:
+            MediaJob.objects.filter(id=job.id, started_at=job.started_at).update(status='queued', error=str(e))
+            model.objects.filter(id=item.id).update(hls_status='pending')
+        return
+
+    playlist = os.path.join(output, 'master.m3u8')
+    with transaction.atomic():
+        # Задачу могли перезапустить с новым файлом, пока шла нарезка - тогда результат не нужен
+        done = MediaJob.objects.filter(
+            id=job.id, source=job.source, status='running', started_at=job.started_at,
+        ).update(status='done', error='', finished_at=timezone.now())
+        if done:
+            model.objects.filter(id=item.id).update(hls_status='ready', hls_playlist=playlist)
+
+    if not done:
+        if blob is None:  # общая нарезка нужна другим фильмам
+            shutil.rmtree(default_storage.path(output), ignore_errors=True)
+        return
+    # Старые версии нарезки объекта больше не нужны (у фильма из blob своих версий не остается)
+    root = default_storage.path(hls_root(job.kind, job.object_id))
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            if entry.name != version:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    catalog_cache.bump()
+
+
+def _finish_failed(job, model, error):
+    MediaJob.objects.filter(id=job.id).update(status='failed', error=error, finished_at=timezone.now())
+    model.objects.filter(id=job.object_id).update(hls_status='failed')
+
+
+def segment(source_path, output_dir):
+    """Режет source_path во все качества и пишет master.m3u8. Папка появляется только целиком."""
+    binary = shutil.which(FFMPEG_BINARY)
+    if binary is None:
+        raise MediaError(f"{FFMPEG_BINARY} не найден")
+
+    # Своя папка сборки у каждого воркера: общую нарезку blob могут собирать двое одновременно.
+    # Брошенные сборки (процесс упал) убирает sweep_media
+    building = f'{output_dir}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        variants = []
+        for name, height, video_bitrate, audio_bitrate in RENDITIONS:
+            os.makedirs(os.path.join(building, name))
+            _run_ffmpeg(binary, source_path, os.path.join(building, name), height, video_bitrate, audio_bitrate)
+            variants.append((name, bits(video_bitrate) + bits(audio_bitrate)))
+
+        with open(os.path.join(building, 'master.m3u8'), 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-VERSION:3\n')
+            for name, bandwidth in variants:
+                f.write(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},NAME="{name}"\n{name}/index.m3u8\n')
+        try:
+            os.replace(building, output_dir)
+        except OSError:
+            # Ту же общую нарезку успел закончить другой воркер
+            if not os.path.exists(os.path.join(output_dir, 'master.m3u8')):
+                raise
+            shutil.rmtree(building, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+
+
+def _run_ffmpeg(binary, source_path, target, height, video_bitrate, audio_bitrate):
+    command = [
+        binary, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        '-i', source_path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        # Не растягиваем ролик выше исходного размера
+        '-vf', f"scale=-2:'min({height},ih)'",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+        '-b:v', video_bitrate, '-maxrate', video_bitrate, '-bufsize', f'{bits(video_bitrate) * 2 // 1000}k',
+        # Ключевой кадр на каждой границе сегмента: качества переключаются без рывков
+        '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})', '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '2',
+        '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(target, 'seg_%05d.ts'),
+        os.path.join(target, 'index.m3u8'),
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=JOB_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise MediaError(f"ffmpeg не уложился в {JOB_TIMEOUT} с")
+    if result.returncode != 0:
+        raise MediaError(result.stderr.decode(errors='replace')[-2000:].strip() or f"ffmpeg код {result.returncode}")
+
+
+def bits(rate):
+    """'800k' -> 800000"""
+    rate = str(rate).lower()
+    if rate.endswith('k'):
+        return int(float(rate[:-1]) * 1000)
+    if rate.endswith('m'):
+        return int(float(rate[:-1]) * 1000 * 1000)
+    return int(rate)
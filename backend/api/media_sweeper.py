@@ -0,0 +1,278 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import reset_queries
+
+from . import derivatives, media_pipeline, uploads
+from .models import Episode, ImageDigest, MediaJob, Movie, Series, Upload, UserProfile, VideoBlob
+
+"""
+media_sweeper.py
+Уборка файлов в MEDIA_ROOT, на которые больше ничего не ссылается
+(файлы удаленных фильмов, замененные аватарки, брошенные загрузки и нарезки).
+
+Обход идет через os.scandir без списка всех файлов: пути копятся пачками по BATCH_SIZE,
+и каждая пачка сверяется с БД запросами "name IN (...)". Память не зависит от числа файлов
+(кроме набора sha256 живых картинок для папки derivatives - он растет с числом записей в БД).
+Эти sha256 берутся из ImageDigest (их пишет derivatives.py при нарезке); заново читаются только
+картинки без записи, например загруженные до ее появления.
+Свежие файлы (моложе min_age) не трогаем: их может прямо сейчас писать загрузка или ffmpeg.
+Недособранные нарезки (папки *.tmp в hls/) ffmpeg пишет часами, поэтому для них срок -
+MEDIA_JOB_TIMEOUT: после него задачу и так заберут заново, а папка точно брошена.
+"""
+
+BATCH_SIZE = 500  # имен в одном IN (...): с запасом под лимит параметров SQLite
+CHUNK_SIZE = 1024 * 1024
+
+# Поля с именами файлов: файл жив, если его имя есть хоть в одном
+FILE_FIELDS = (
+    (Movie, 'video'),
+    (Movie, 'image'),
+    (Series, 'image'),
+    (Episode, 'video'),
+    (UserProfile, 'photo'),
+    (VideoBlob, 'file'),
+)
+IMAGE_FIELDS = ((Movie, 'image'), (Series, 'image'), (UserProfile, 'photo'))
+HLS_MODELS = {'movie': Movie, 'episode': Episode}
+
+
+def quarantine_root():
+    return getattr(settings, 'MEDIA_QUARANTINE_DIR', None) or str(settings.MEDIA_ROOT).rstrip('/') + '_quarantine'
+
+
+def walk(root, skip=()):
+    """(относительный путь, размер, mtime) всех файлов под root. Держит в памяти только стек папок."""
+    stack = ['']
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, directory)) as entries:
+                for entry in entries:
+                    name = f'{directory}/{entry.name}' if directory else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in skip:
+                            stack.append(name)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        yield name, stat.st_size, stat.st_mtime
+        except FileNotFoundError:
+            continue  # папку удалили, пока мы до нее шли
+
+
+class Sweeper:
+    def __init__(self, action='report', min_age=3600, batch_size=BATCH_SIZE):
+        self.action = action  # report | quarantine | delete
+        self.min_age = min_age
+        self.batch_size = batch_size
+        self.root = str(settings.MEDIA_ROOT)
+        self.usage = {}  # папка верхнего уровня -> [файлов, байт, сирот, байт сирот]
+        self.removed = 0
+        self.quarantine = os.path.join(quarantine_root(), time.strftime('%Y%m%d-%H%M%S'))
+        # Заглушки по умолчанию (movie_images/default.jpg) нужны, даже если на них никто не ссылается
+        self.defaults = {
+            field.default for model, name in FILE_FIELDS
+            for field in [model._meta.get_field(name)] if isinstance(field.default, str)
+        }
+        uploads_dir = getattr(settings, 'UPLOAD_TEMP_DIR', '') or os.path.join(self.root, 'uploads')
+        uploads_dir = os.path.relpath(uploads_dir, self.root)
+        # Недокачанные части проверяем, только если UPLOAD_TEMP_DIR лежит внутри MEDIA_ROOT
+        self.uploads_prefix = None if uploads_dir.startswith('..') else uploads_dir + '/'
+        self._live_digests = None
+
+    def run(self):
+        skip = set()
+        if os.path.abspath(quarantine_root()).startswith(os.path.abspath(self.root) + os.sep):
+            skip.add(os.path.relpath(quarantine_root(), self.root))
+        cutoff = time.time() - self.min_age
+        building_cutoff = time.time() - max(self.min_age, media_pipeline.JOB_TIMEOUT)
+        batch = []
+        for name, size, mtime in walk(self.root, skip):
+            usage = self.usage.setdefault(top_dir(name), [0, 0, 0, 0])
+            usage[0] += 1
+            usage[1] += size
+            if mtime > (building_cutoff if is_hls_building(name) else cutoff):
+                continue
+            batch.append((name, size))
+            if len(batch) >= self.batch_size:
+                self.process(batch)
+                batch = []
+        if batch:
+            self.process(batch)
+        if self.action != 'report':
+            self.forget_stale_digests()
+        return self.usage
+
+    # === ПРОВЕРКА ПАЧКИ ===
+
+    def process(self, batch):
+        names = [name for name, _ in batch]
+        live = self.referenced(names)
+        reset_queries()  # при DEBUG=True Django копит текст каждого запроса - на миллионах файлов это заметно
+        for name, size in batch:
+            if name in live:
+                continue
+            usage = self.usage[top_dir(name)]
+            usage[2] += 1
+            usage[3] += size
+            self.remove(name)
+
+    def referenced(self, names):
+        """Подмножество names, на которое есть ссылка в БД."""
+        live = {name for name in names if name in self.defaults}
+        for model, field in FILE_FIELDS:
+            live.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+
+        hls = [name for name in names if name.startswith('hls/')]
+        if hls:
+            live.update(self.referenced_hls(hls))
+        if self.uploads_prefix:
+            parts = [name for name in names if name.startswith(self.uploads_prefix)]
+            if parts:
+                live.update(self.referenced_uploads(parts))
+        generated = [name for name in names if name.startswith(derivatives.ROOT + '/')]
+        if generated:
+            digests = self.live_digests()
+            live.update(name for name in generated if os.path.basename(name).split('-', 1)[0] in digests)
+        return live
+
+    def referenced_hls(self, names):
+        # hls/<kind>/<id>/<версия>/... жив, если модель указывает плейлистом именно в эту версию
+        # или по объекту идет нарезка (готовая папка уже на месте, а hls_playlist еще не записан);
+        # hls/blob/ab/<sha256>/... (общая нарезка, media_pipeline.py) - пока жив сам VideoBlob
+        wanted = {}
+        blob_names = {}
+        for name in names:
+            parts = name.split('/')
+            if len(parts) >= 5 and parts[1] in HLS_MODELS and parts[2].isdigit():
+                wanted.setdefault(parts[1], set()).add(int(parts[2]))
+            elif len(parts) >= 5 and parts[1] == 'blob':
+                blob_names.setdefault(parts[3], []).append(name)
+        live = set()
+        if blob_names:
+            for digest in VideoBlob.objects.filter(sha256__in=list(blob_names)).values_list('sha256', flat=True):
+                live.update(blob_names[digest])
+        playlists = set()
+        processing = set()
+        for kind, ids in wanted.items():
+            playlists.update(
+                HLS_MODELS[kind].objects.filter(id__in=ids).exclude(hls_playlist='').values_list('hls_playlist', flat=True)
+            )
+            running = MediaJob.objects.filter(kind=kind, object_id__in=ids, status='running')
+            processing.update(f'hls/{kind}/{object_id}/' for object_id in running.values_list('object_id', flat=True))
+        live.update(name for name in names if '/'.join(name.split('/')[:3]) + '/' in processing)
+        versions = {os.path.dirname(playlist) + '/' for playlist in playlists}
+        live.update(name for name in names if '/'.join(name.split('/')[:4]) + '/' in versions)
+        return live
+
+    def referenced_uploads(self, names):
+        # <UPLOAD_TEMP_DIR>/<uuid>.part жив, пока загрузка не завершена и не просрочена (UPLOAD_EXPIRY)
+        ids = {}
+        for name in names:
+            stem = name[len(self.uploads_prefix):]
+            if stem.endswith('.part') and '/' not in stem:
+                ids[stem[:-len('.part')]] = name
+        active = Upload.objects.filter(
+            id__in=[i for i in ids if is_uuid(i)], status='uploading', updated_at__gte=uploads.expiry_cutoff(),
+        )
+        return {ids[str(upload_id)] for upload_id in active.values_list('id', flat=True)}
+
+    def live_digests(self):
+        """sha256 всех текущих картинок: по ним названы их уменьшенные копии (derivatives.py)."""
+        if self._live_digests is None:
+            digests = set()
+            for model, field in IMAGE_FIELDS:
+                names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                batch = []
+                for name in names.values_list(field, flat=True).distinct().iterator(chunk_size=self.batch_size):
+                    batch.append(name)
+                    if len(batch) >= self.batch_size:
+                        digests.update(self.image_digests(batch))
+                        batch = []
+                if batch:
+                    digests.update(self.image_digests(batch))
+            self._live_digests = digests
+        return self._live_digests
+
+    def image_digests(self, names):
+        stored = dict(ImageDigest.objects.filter(name__in=names).values_list('name', 'sha256'))
+        for name in names:
+            if name in stored:
+                continue
+            digest = file_sha256(name)
+            if digest:
+                stored[name] = digest
+                if self.action != 'report':
+                    derivatives.remember_digest(name, digest)
+        return stored.values()
+
+    def forget_stale_digests(self):
+        """Удаляет sha256 картинок, на которые больше не ссылается ни одна модель."""
+        stale = ImageDigest.objects.all()
+        for model, field in IMAGE_FIELDS:
+            # NULL в подзапросе NOT IN отменил бы удаление целиком
+            stale = stale.exclude(name__in=model.objects.exclude(**{f'{field}__isnull': True}).values(field))
+        return stale.delete()[0]
+
+    # === УДАЛЕНИЕ ===
+
+    def remove(self, name):
+        if self.action == 'report':
+            return
+        path = os.path.join(self.root, name)
+        try:
+            if self.action == 'quarantine':
+                target = os.path.join(self.quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            return
+        self.removed += 1
+        prune_empty_dirs(os.path.dirname(path), self.root)
+
+
+def file_sha256(name):
+    try:
+        digest = hashlib.sha256()
+        with default_storage.open(name, 'rb') as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+
+def is_hls_building(name):
+    """Файл недособранной нарезки: media_pipeline.segment пишет в <папка>.<случайное>.tmp/."""
+    return name.startswith('hls/') and any(part.endswith('.tmp') for part in name.split('/')[:-1])
+
+
+def top_dir(name):
+    return name.split('/', 1)[0] if '/' in name else '.'
+
+
+def prune_empty_dirs(directory, root):
+    """Удаляет опустевшие вложенные папки (hls/<kind>/<id>/<версия>/ и т.п.); папки верхнего уровня остаются."""
+    root = os.path.abspath(root)
+    directory = os.path.abspath(directory)
+    while os.path.dirname(directory).startswith(root + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return  # не пустая
+        directory = os.path.dirname(directory)
+
+
+def is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,21 @@
+import threading
+from collections import Counter
+
+"""
+metrics.py
+Счетчики событий realtime-части (в пределах процесса).
+Отдаются администратору через /api/stats/realtime/.
+"""
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
@@ -0,0 +1,64 @@
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .db_routers import use_primary
+
+"""
+middleware.py
+Middleware проекта.
+
+StaticFilesMiddleware - WhiteNoise, который умеет работать в async-цепочке.
+Оригинальный WhiteNoiseMiddleware только синхронный: под daphne Django из-за него
+переводит в поток каждый запрос, включая async-представления (async_views.py).
+Здесь в поток уходят только запросы под STATIC_URL - их целиком обрабатывает обычный
+WhiteNoiseMiddleware через публичный __call__; остальные идут дальше без смены потока.
+
+PrimaryDatabaseMiddleware - запросы, которые что-то меняют, читают с основной базы
+(см. db_routers.py). Подключается в settings.py вместе с ReplicaRouter.
+"""
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def static_prefix():
+    prefix = urlparse(settings.STATIC_URL or '').path
+    return prefix if prefix.startswith('/') else '/' + prefix
+
+
+@sync_and_async_middleware
+def StaticFilesMiddleware(get_response):
+    if not iscoroutinefunction(get_response):
+        return WhiteNoiseMiddleware(get_response)
+
+    # Отдельный экземпляр WhiteNoise без продолжения цепочки: если файла нет, он вернет None
+    serve_static = sync_to_async(WhiteNoiseMiddleware(lambda request: None))
+    prefix = static_prefix()
+
+    async def middleware(request):
+        if request.path_info.startswith(prefix):
+            response = await serve_static(request)
+            if response is not None:
+                return response
+        return await get_response(request)
+    return middleware
+
+
+@sync_and_async_middleware
+def PrimaryDatabaseMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if request.method in SAFE_METHODS:
+                return await get_response(request)
+            with use_primary():
+                return await get_response(request)
+    else:
+        def middleware(request):
+            if request.method in SAFE_METHODS:
+                return get_response(request)
+            with use_primary():
+                return get_response(request)
+    return middleware
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+"""
+Индекс полнотекстового поиска (api/search.py). Только для SQLite: в PostgreSQL
+поиск идет через tsvector без отдельной таблицы.
+rowid: фильм -> id * 2, сериал -> id * 2 + 1.
+"""
+
+CREATE_SQL = """
+CREATE VIRTUAL TABLE api_search_index USING fts5(
+    title, body, is_private UNINDEXED, owner_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+FILL_SQL = (
+    """
+    INSERT INTO api_search_index (rowid, title, body, is_private, owner_id)
+    SELECT id * 2, title, description, is_private, uploaded_by_id FROM api_movie
+    """,
+    """
+    INSERT INTO api_search_index (rowid, title, body, is_private, owner_id)
+    SELECT s.id * 2 + 1, s.title,
+           s.description || ' ' || COALESCE((SELECT group_concat(e.title, ' ') FROM api_episode e
+                                             WHERE e.series_id = s.id), ''),
+           s.is_private, s.uploaded_by_id
+    FROM api_series s
+    """,
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    for sql in FILL_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS api_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_message_room_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
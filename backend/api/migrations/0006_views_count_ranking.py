@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 04:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='series',
+            name='views_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Ranking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('RA', 'Recently Added'), ('MW', 'Most Watched'), ('TR', 'Top Rated')], max_length=2)),
+                ('kind', models.CharField(choices=[('movie', 'Movie'), ('series', 'Series')], max_length=6)),
+                ('position', models.PositiveIntegerField()),
+                ('object_id', models.PositiveIntegerField()),
+                ('views_count', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['board', 'kind', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('board', 'kind', 'position'), name='ranking_board_kind_position_uniq')],
+            },
+        ),
+    ]
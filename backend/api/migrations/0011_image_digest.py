@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_upload_attached'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(max_length=64)),
+            ],
+        ),
+    ]
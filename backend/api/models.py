@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -45,6 +47,15 @@ class UserPermissions(models.Model):
 
 # === ОСНОВНОЙ КОНТЕНТ ===
 
+# Состояние нарезки видео в HLS (api/media_pipeline.py)
+HLS_STATUS_CHOICES = (
+    ('', 'Not processed'),
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+)
+
 class Movie(models.Model):
     """
     Модель Фильма.
@@ -75,6 +86,11 @@ class Movie(models.Model):
     video_url = models.URLField(blank=True, null=True) # Если видео на внешнем хостинге
     video = models.FileField(upload_to='videos/', blank=True, null=True) # Если загружаем файл локально
     image = models.ImageField(upload_to='movie_images/', default='movie_images/default.jpg')
+    # HLS-версия загруженного файла: путь к master.m3u8 внутри MEDIA_ROOT
+    hls_status = models.CharField(choices=HLS_STATUS_CHOICES, max_length=10, blank=True, default='')
+    hls_playlist = models.CharField(max_length=255, blank=True)
+    # Загруженный в комнату файл лежит в общем хранилище (api/blobs.py), video указывает на него
+    blob = models.ForeignKey('VideoBlob', on_delete=models.SET_NULL, null=True, blank=True, related_name='movies')
     
     # Связи и флаги
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploaded_movies')
@@ -89,6 +105,7 @@ class Series(models.Model):
     
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     is_private = models.BooleanField(default=False)
+    views_count = models.IntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -98,6 +115,8 @@ class Episode(models.Model):
     number = models.PositiveIntegerField(verbose_name="Номер серии")
     title = models.CharField(max_length=255, blank=True, verbose_name="Название серии")
     video = models.FileField(upload_to='episodes/', verbose_name="Файл видео")
+    hls_status = models.CharField(choices=HLS_STATUS_CHOICES, max_length=10, blank=True, default='')
+    hls_playlist = models.CharField(max_length=255, blank=True)
     
     class Meta:
         ordering = ['number'] # Чтобы серии шли по порядку
@@ -105,6 +124,69 @@ class Episode(models.Model):
     def __str__(self):
         return f"{self.series.title} - Эпизод {self.number}"
 
+class MediaJob(models.Model):
+    """
+    Задача нарезки видео в HLS. Очередь хранится в БД: после перезапуска
+    воркеры (api/media_pipeline.py) продолжают с того же места.
+    """
+    KIND_CHOICES = (
+        ('movie', 'Movie'),
+        ('episode', 'Episode'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(choices=KIND_CHOICES, max_length=7)
+    object_id = models.PositiveIntegerField()
+    source = models.CharField(max_length=255)  # имя файла, из которого режем (повторная загрузка -> новая задача)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=7, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='mediajob_kind_object_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'], name='mediajob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.status}"
+
+class Ranking(models.Model):
+    """
+    Предрасчитанные подборки каталога (например, "Most Watched").
+    Пересчитываются периодически (api/rankings.py), чтение - по индексу (board, kind, position).
+    """
+    KIND_CHOICES = (
+        ('movie', 'Movie'),
+        ('series', 'Series'),
+    )
+
+    board = models.CharField(choices=Movie.STATUS_CHOICES, max_length=2)
+    kind = models.CharField(choices=KIND_CHOICES, max_length=6)
+    position = models.PositiveIntegerField()
+    object_id = models.PositiveIntegerField()
+    views_count = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['board', 'kind', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'kind', 'position'], name='ranking_board_kind_position_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.board} {self.kind} #{self.position}: {self.object_id}"
+
 # --- Комнаты и Сообщения ---
 
 class Room(models.Model):
@@ -157,5 +239,64 @@ class Message(models.Model):
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # История чата листается по ключу (комната, время, id) - см. MessageKeysetPagination
+        indexes = [
+            models.Index(fields=['room', 'timestamp', 'id'], name='message_room_ts_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.content[:20]}"
+
+
+class VideoBlob(models.Model):
+    """
+    Файл видео, сохраненный один раз по sha256 содержимого (api/blobs.py).
+    Одинаковые загрузки ссылаются на один blob; файл удаляется, когда ref_count доходит до нуля.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/', max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} x{self.ref_count}"
+
+class ImageDigest(models.Model):
+    """
+    sha256 картинки (постер, аватарка) по ее имени в хранилище. Записывается при нарезке
+    уменьшенных копий (api/derivatives.py), по нему sweep_media узнает живые копии, не перечитывая оригиналы.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"{self.name} {self.sha256[:12]}"
+
+class Upload(models.Model):
+    """
+    Докачиваемая загрузка видео частями (api/uploads.py).
+    Файл копится на диске по смещению offset; после finalize и проверки
+    контрольной суммы из него создается приватный Movie. Movie подключается
+    к одной комнате (status='attached'), брошенные недокачанные загрузки истекают через UPLOAD_EXPIRY.
+    """
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('attached', 'Attached'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    checksum = models.CharField(max_length=64, blank=True)  # sha256 (hex), можно прислать при finalize
+    status = models.CharField(choices=STATUS_CHOICES, max_length=10, default='uploading')
+    movie = models.ForeignKey(Movie, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"{self.user.username}: {self.content[:20]}"
\ No newline at end of file
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,74 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+"""
+pagination.py
+Пагинация истории чата по ключу (timestamp, id) вместо OFFSET.
+Без курсора отдаются последние N сообщений, с ?before=<курсор> - N сообщений перед ним.
+Внутри страницы сообщения идут по возрастанию времени (как их рисует чат).
+"""
+
+
+class MessageKeysetPagination(BasePagination):
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'before'
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        queryset = queryset.order_by('-timestamp', '-id')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+        # Берем на одну запись больше, чтобы понять, есть ли что-то старше
+        rows = list(queryset[:self.limit + 1])
+        self.has_older = len(rows) > self.limit
+        rows = rows[:self.limit]
+        self.oldest = rows[-1] if rows else None
+        rows.reverse()
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        """Ссылка на более старую страницу."""
+        if not self.has_older or self.oldest is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.oldest))
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    @staticmethod
+    def encode_cursor(message):
+        raw = f'{message.timestamp.isoformat()}|{message.id}'
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            timestamp, pk = raw.split('|')
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (ValueError, UnicodeError):
+            raise NotFound('Неверный курсор')
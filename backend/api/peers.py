@@ -0,0 +1,33 @@
+"""
+peers.py
+Справочник username -> channel_name для адресной доставки WebRTC-сигналов.
+Хранится в памяти процесса по комнатам. Заполняется из событий комнаты, которые
+приходят через channel layer (вход/выход, сигналы WebRTC), поэтому знает и про
+сокеты на других нодах. У одного пользователя может быть несколько вкладок.
+"""
+
+_directory = {}  # room_name -> {username: {channel_name, ...}}
+
+
+def register(room_name, username, channel_name):
+    if not username or not channel_name:
+        return
+    _directory.setdefault(room_name, {}).setdefault(username, set()).add(channel_name)
+
+
+def unregister(room_name, username, channel_name):
+    users = _directory.get(room_name)
+    if not users or username not in users:
+        return
+    users[username].discard(channel_name)
+    if not users[username]:
+        del users[username]
+
+
+def lookup(room_name, username):
+    """Каналы пользователя в комнате (пустой набор, если неизвестен)."""
+    return set(_directory.get(room_name, {}).get(username, ()))
+
+
+def evict(room_name):
+    _directory.pop(room_name, None)
@@ -0,0 +1,141 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .background import PeriodicTask
+from .models import Room
+
+"""
+playback.py
+Серверные "часы" воспроизведения комнаты.
+Состояние (играет/пауза, позиция, момент замера, серия) обновляется из событий
+play/pause/seek/sync, отдается новому сокету одним сообщением при входе и
+периодически сохраняется в Room.current_time.
+"""
+
+FLUSH_INTERVAL = getattr(settings, 'PLAYBACK_FLUSH_INTERVAL', 5.0)
+
+
+@dataclass
+class PlaybackState:
+    room_id: int
+    playing: bool = False
+    position: float = 0.0
+    anchor: float = 0.0  # момент (time.time()), в который позиция была равна position
+    episode_id: Optional[int] = None
+    authoritative: bool = False  # True, если видели живые события, а не только значение из БД
+    dirty: bool = False
+
+    def current_position(self, now=None):
+        if not self.playing:
+            return self.position
+        now = time.time() if now is None else now
+        return self.position + max(0.0, now - self.anchor)
+
+    def apply(self, action, payload, ts):
+        """
+        Применяет видео-событие с серверной меткой времени ts.
+        Одно и то же событие приходит каждому сокету комнаты, поэтому
+        повторное применение ничего не меняет, а более старые события игнорируются.
+        """
+        if ts < self.anchor:
+            return
+
+        position = _parse_time(payload.get('currentTime'))
+        if position is None:
+            position = self.current_position(ts)
+
+        if action == 'play':
+            self.playing = True
+        elif action == 'pause':
+            self.playing = False
+        elif action in ('sync', 'response_sync') and 'paused' in payload:
+            self.playing = not payload.get('paused')
+
+        self.position = position
+        self.anchor = ts
+        self.authoritative = True
+        self.dirty = True
+
+    def reset(self, episode_id, ts):
+        """Смена видео/серии: начинаем с нуля на паузе."""
+        if ts < self.anchor:
+            return
+        self.playing = False
+        self.position = 0.0
+        self.anchor = ts
+        self.episode_id = episode_id
+        self.authoritative = True
+        self.dirty = True
+
+    def as_sync_data(self):
+        # Формат совпадает с response_sync, который фронтенд уже умеет применять
+        return {
+            'currentTime': self.current_position(),
+            'paused': not self.playing,
+            'episode_id': self.episode_id,
+        }
+
+
+def _parse_time(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+_clocks = {}  # room_name -> PlaybackState
+
+
+def get_clock(room_name, room_state):
+    """Часы комнаты; при первом обращении начинаем с сохраненного Room.current_time."""
+    clock = _clocks.get(room_name)
+    if clock is None and room_state is not None:
+        clock = PlaybackState(
+            room_id=room_state.room_id,
+            position=room_state.current_time,
+            episode_id=room_state.active_episode_id,
+        )
+        _clocks[room_name] = clock
+        _flusher.ensure_running()
+    return clock
+
+
+def authoritative_clock(room_name):
+    """Часы комнаты, если им можно верить без опроса клиентов, иначе None."""
+    clock = _clocks.get(room_name)
+    return clock if clock is not None and clock.authoritative else None
+
+
+async def evict(room_name):
+    """Последний локальный сокет ушел: сохраняем позицию и забываем часы."""
+    clock = _clocks.pop(room_name, None)
+    # Играющие часы flush сохраняет без флага dirty - их последнюю позицию тоже надо записать
+    if clock is not None and (clock.dirty or clock.playing):
+        await _save_positions([(clock.room_id, clock.current_position())])
+
+
+async def flush():
+    dirty = []
+    for clock in _clocks.values():
+        # Пока видео играет, позиция меняется сама -> сохраняем на каждом проходе
+        if clock.dirty or clock.playing:
+            clock.dirty = False
+            dirty.append((clock.room_id, clock.current_position()))
+    if dirty:
+        await _save_positions(dirty)
+
+
+@database_sync_to_async
+def _save_positions(positions):
+    with transaction.atomic():
+        for room_id, position in positions:
+            Room.objects.filter(id=room_id).update(current_time=position)
+
+
+_flusher = PeriodicTask(FLUSH_INTERVAL, flush, name='playback flush')
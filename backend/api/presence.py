@@ -0,0 +1,154 @@
+import asyncio
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from .background import PeriodicTask
+from .models import Room
+
+"""
+presence.py
+Кто сейчас находится в комнатах - без записи в Room.participants на каждый вход/выход.
+Свои сокеты нода знает точно (_local). Раз в HEARTBEAT_INTERVAL нода рассылает снимок
+своих комнат через channel layer, а снимки других нод (_remote) живут 3 интервала:
+если нода упала, ее участники пропадут сами.
+Room.participants сверяется с этим представлением периодически, пачкой.
+"""
+
+HEARTBEAT_INTERVAL = getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 10.0)
+RECONCILE_INTERVAL = getattr(settings, 'PRESENCE_RECONCILE_INTERVAL', 60.0)
+PRESENCE_GROUP = 'filmhub_presence'
+
+NODE_ID = uuid.uuid4().hex
+
+_local = {}       # room_name -> {'room_id': id, 'channels': {channel_name: user_id}}
+_remote = {}      # node_id -> (expires_at, {room_name: [user_id, ...]})
+_to_reconcile = {}  # room_name -> room_id: комнаты, опустевшие на этой ноде до следующей сверки
+_started = False
+_node_channel = None
+
+
+def join(room_name, room_id, channel_name, user_id):
+    room = _local.setdefault(room_name, {'room_id': room_id, 'channels': {}})
+    room['channels'][channel_name] = user_id
+
+
+def leave(room_name, channel_name):
+    room = _local.get(room_name)
+    if room is None:
+        return
+    room['channels'].pop(channel_name, None)
+    if not room['channels']:
+        del _local[room_name]
+        _to_reconcile[room_name] = room['room_id']
+
+
+def user_ids(room_name):
+    """Множество id пользователей в комнате по всем нодам."""
+    now = time.monotonic()
+    result = set(_local.get(room_name, {}).get('channels', {}).values())
+    for expires_at, rooms in list(_remote.values()):
+        if expires_at > now:
+            result.update(rooms.get(room_name, ()))
+    return result
+
+
+def participants_count(room_name):
+    """Число участников или None, если в этом процессе присутствие не отслеживается."""
+    if not _started:
+        return None
+    return len(user_ids(room_name))
+
+
+async def ensure_started():
+    """Запускает рассылку снимков, прием снимков других нод и сверку с БД."""
+    global _started, _node_channel
+    if _started:
+        return
+    _started = True
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        _node_channel = await channel_layer.new_channel('presence.')
+        await channel_layer.group_add(PRESENCE_GROUP, _node_channel)
+        asyncio.get_running_loop().create_task(_listen(channel_layer))
+        _heartbeat.ensure_running()
+    _reconciler.ensure_running()
+
+
+async def _listen(channel_layer):
+    while True:
+        try:
+            message = await channel_layer.receive(_node_channel)
+            if message.get('type') == 'presence.snapshot' and message['node'] != NODE_ID:
+                _remote[message['node']] = (time.monotonic() + 3 * HEARTBEAT_INTERVAL, message['rooms'])
+        except Exception as e:
+            print(f"🔥 Presence listener error: {e}")
+            await asyncio.sleep(1)
+
+
+async def heartbeat():
+    channel_layer = get_channel_layer()
+    # Повторный group_add продлевает членство (у группы в channel layer есть срок жизни)
+    await channel_layer.group_add(PRESENCE_GROUP, _node_channel)
+    await channel_layer.group_send(PRESENCE_GROUP, {
+        'type': 'presence.snapshot',
+        'node': NODE_ID,
+        'rooms': {
+            room_name: sorted(set(room['channels'].values()))
+            for room_name, room in _local.items()
+        },
+    })
+    now = time.monotonic()
+    for node, (expires_at, _rooms) in list(_remote.items()):
+        if expires_at <= now:
+            del _remote[node]
+
+
+async def reconcile():
+    rooms = {name: room['room_id'] for name, room in _local.items()}
+    rooms.update(_to_reconcile)
+    _to_reconcile.clear()
+    if rooms:
+        await _write_participants({room_id: user_ids(name) for name, room_id in rooms.items()})
+
+
+@database_sync_to_async
+def _write_participants(expected):
+    """Приводит Room.participants к expected ({room_id: {user_id}}) за несколько запросов на все комнаты."""
+    through = Room.participants.through
+    # Комнаты и пользователей могли удалить, пока сокеты были открыты
+    alive_rooms = set(Room.objects.filter(id__in=expected).values_list('id', flat=True))
+    all_users = set().union(*expected.values())
+    alive_users = set(User.objects.filter(id__in=all_users).values_list('id', flat=True))
+    expected = {
+        room_id: users & alive_users
+        for room_id, users in expected.items() if room_id in alive_rooms
+    }
+    current = {}
+    for room_id, user_id in through.objects.filter(room_id__in=expected).values_list('room_id', 'user_id'):
+        current.setdefault(room_id, set()).add(user_id)
+
+    to_add = []
+    to_remove = Q()
+    for room_id, users in expected.items():
+        existing = current.get(room_id, set())
+        to_add += [through(room_id=room_id, user_id=user_id) for user_id in users - existing]
+        stale = existing - users
+        if stale:
+            to_remove |= Q(room_id=room_id, user_id__in=stale)
+
+    with transaction.atomic():
+        if to_add:
+            through.objects.bulk_create(to_add, ignore_conflicts=True)
+        if to_remove:
+            through.objects.filter(to_remove).delete()
+
+
+_heartbeat = PeriodicTask(HEARTBEAT_INTERVAL, heartbeat, name='presence heartbeat')
+_reconciler = PeriodicTask(RECONCILE_INTERVAL, reconcile, name='presence reconcile')
@@ -0,0 +1,73 @@
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalog_cache
+from .background import PeriodicTask
+from .models import Movie, Ranking, Series
+
+"""
+rankings.py
+Пересчет подборок каталога в таблицу Ranking.
+Сортировка по всему каталогу выполняется раз в RANKING_INTERVAL, а списки
+"Most Watched" читают готовые позиции по индексу.
+В подборку попадают только публичные фильмы и сериалы.
+
+"Top Rated" не считается: оценок в модели нет, считать его не из чего.
+"""
+
+RANKING_INTERVAL = getattr(settings, 'RANKING_INTERVAL', 300.0)
+RANKING_SIZE = getattr(settings, 'RANKING_SIZE', 50)
+MOST_WATCHED = 'MW'
+MODELS = {'movie': Movie, 'series': Series}
+
+
+def recompute(size=RANKING_SIZE):
+    """Пересобирает "Most Watched". Возвращает число позиций."""
+    now = timezone.now()
+    entries = []
+    for kind, model in MODELS.items():
+        top = (
+            model.objects
+            .filter(is_private=False, views_count__gt=0)
+            .order_by('-views_count', '-id')
+            .values_list('id', 'views_count')[:size]
+        )
+        entries += [
+            Ranking(board=MOST_WATCHED, kind=kind, position=position, object_id=object_id,
+                    views_count=views_count, computed_at=now)
+            for position, (object_id, views_count) in enumerate(top, start=1)
+        ]
+
+    with transaction.atomic():
+        Ranking.objects.filter(board=MOST_WATCHED).delete()
+        Ranking.objects.bulk_create(entries)
+    # Счетчики просмотров пишутся через F() без сигналов -> обновляем кэш каталога здесь
+    catalog_cache.bump()
+    return len(entries)
+
+
+def ranked(kind, queryset=None, board=MOST_WATCHED, limit=RANKING_SIZE):
+    """Объекты подборки по порядку: два запроса по индексу, без сортировки каталога."""
+    if queryset is None:
+        queryset = MODELS[kind].objects.all()
+    ids = list(
+        Ranking.objects.filter(board=board, kind=kind)
+        .order_by('position')
+        .values_list('object_id', flat=True)[:limit]
+    )
+    objects = queryset.in_bulk(ids)
+    return [objects[object_id] for object_id in ids if object_id in objects]
+
+
+async def _recompute():
+    await database_sync_to_async(recompute)()
+
+
+_recomputer = PeriodicTask(RANKING_INTERVAL, _recompute, name='rankings recompute')
+
+
+def ensure_running():
+    """Запускает периодический пересчет в event loop процесса daphne."""
+    _recomputer.ensure_running()
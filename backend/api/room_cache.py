@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+
+from .models import Room
+
+"""
+room_cache.py
+Кэш состояния комнат для PlayerConsumer (в пределах одного процесса daphne).
+Состояние читается из БД один раз при первом подключении к комнате, общее для всех
+сокетов этой комнаты и выбрасывается, когда уходит последний локальный сокет.
+Когда комнату меняют через API, вьюсет рассылает сброс кэша через channel layer.
+"""
+
+
+def get_room_group_name(room_name):
+    # Безопасное имя группы (channel layer не принимает кириллицу и пробелы)
+    safe_group_name = hashlib.md5(room_name.encode('utf-8')).hexdigest()
+    return f'room_{safe_group_name}'
+
+
+@dataclass
+class RoomState:
+    """Снимок полей комнаты, которые нужны сокетам."""
+    room_id: int
+    owner_username: str
+    max_participants: int
+    is_protected: bool
+    video_id: Optional[int]
+    active_series_id: Optional[int]
+    active_episode_id: Optional[int]
+    current_time: float
+
+
+_states = {}     # room_name -> RoomState (или None, если комнаты нет в БД)
+_consumers = {}  # room_name -> сколько локальных сокетов подключено
+_stale = set()   # комнаты, которые нужно перечитать при следующем обращении
+_loading = {}    # room_name -> Task загрузки (чтобы не читать одну комнату дважды)
+
+
+@database_sync_to_async
+def _load_room_state(room_name):
+    room = Room.objects.select_related('owner').filter(name=room_name).first()
+    if room is None:
+        return None
+    return RoomState(
+        room_id=room.id,
+        owner_username=room.owner.username,
+        max_participants=room.max_participants,
+        is_protected=bool(room.password and room.password.strip()),
+        video_id=room.video_id,
+        active_series_id=room.active_series_id,
+        active_episode_id=room.active_episode_id,
+        current_time=room.current_time,
+    )
+
+
+async def get_room_state(room_name):
+    """Возвращает RoomState из кэша, при необходимости загружая его из БД."""
+    if room_name in _states and room_name not in _stale:
+        return _states[room_name]
+
+    _stale.discard(room_name)
+    task = _loading.get(room_name)
+    if task is None:
+        task = asyncio.ensure_future(_load_room_state(room_name))
+        _loading[room_name] = task
+        try:
+            state = await task
+        finally:
+            _loading.pop(room_name, None)
+    else:
+        state = await task
+
+    # Храним только пока в комнате есть локальные сокеты
+    if room_name in _consumers:
+        _states[room_name] = state
+    return state
+
+
+async def acquire(room_name):
+    """Вызывается при подключении сокета к комнате."""
+    _consumers[room_name] = _consumers.get(room_name, 0) + 1
+    return await get_room_state(room_name)
+
+
+def release(room_name):
+    """
+    Вызывается при отключении сокета. Последний сокет выселяет комнату из кэша.
+    Возвращает True, если комната выселена.
+    """
+    count = _consumers.get(room_name, 0) - 1
+    if count > 0:
+        _consumers[room_name] = count
+        return False
+    _consumers.pop(room_name, None)
+    _states.pop(room_name, None)
+    _stale.discard(room_name)
+    return True
+
+
+def invalidate(room_name):
+    if room_name in _states or room_name in _loading:
+        _stale.add(room_name)
+
+
+def notify_room_changed(room_name):
+    """
+    Сбрасывает кэш комнаты на всех нодах (синхронный код, для вьюсетов).
+    Каждый PlayerConsumer комнаты получает room_changed_event и вызывает invalidate().
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        get_room_group_name(room_name),
+        {'type': 'room_changed_event'}
+    )
@@ -0,0 +1,154 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Movie, Series
+
+"""
+search.py
+Полнотекстовый поиск по фильмам и сериалам (название, описание, названия серий).
+
+SQLite: виртуальная таблица FTS5 api_search_index (создается миграцией 0005),
+синхронизируется сигналами (signals.py), полностью пересобирается командой
+rebuild_search_index. rowid кодирует объект: фильм -> id * 2, сериал -> id * 2 + 1,
+поэтому обновление записи - это точечные DELETE/INSERT по rowid.
+PostgreSQL: индекс не нужен, ищем через tsvector (SearchVector/SearchRank).
+
+Видимость как в MovieViewSet.get_queryset: публичное или загруженное самим пользователем.
+"""
+
+TABLE = 'api_search_index'
+MOVIE, SERIES = 'movie', 'series'
+# Вес совпадения в названии относительно описания (bm25 в SQLite, A/B в PostgreSQL)
+TITLE_WEIGHT = 10.0
+PG_CONFIG = 'simple'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def use_fts():
+    return connection.vendor == 'sqlite'
+
+
+def query_words(text):
+    return _WORD_RE.findall(text or '')[:10]
+
+
+# === СИНХРОНИЗАЦИЯ ИНДЕКСА (только SQLite) ===
+
+def _write_row(rowid, title, body, is_private, owner_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, body, is_private, owner_id) VALUES (%s, %s, %s, %s, %s)',
+            [rowid, title, body, int(is_private), owner_id],
+        )
+
+
+def _delete_row(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+
+
+def index_movie(movie):
+    if use_fts():
+        _write_row(movie.id * 2, movie.title, movie.description, movie.is_private, movie.uploaded_by_id)
+
+
+def unindex_movie(movie_id):
+    if use_fts():
+        _delete_row(movie_id * 2)
+
+
+def index_series(series_id):
+    """Переиндексирует сериал вместе с названиями серий (или убирает, если его уже нет)."""
+    if not use_fts():
+        return
+    series = Series.objects.filter(id=series_id).first()
+    if series is None:
+        _delete_row(series_id * 2 + 1)
+        return
+    episode_titles = ' '.join(title for title in series.episodes.values_list('title', flat=True) if title)
+    _write_row(series.id * 2 + 1, series.title, f'{series.description} {episode_titles}',
+               series.is_private, series.uploaded_by_id)
+
+
+def unindex_series(series_id):
+    if use_fts():
+        _delete_row(series_id * 2 + 1)
+
+
+def rebuild():
+    """Полная пересборка индекса. Возвращает число проиндексированных объектов."""
+    if not use_fts():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    for movie in Movie.objects.all().iterator():
+        index_movie(movie)
+    for series_id in Series.objects.values_list('id', flat=True).iterator():
+        index_series(series_id)
+    return Movie.objects.count() + Series.objects.count()
+
+
+# === ПОИСК ===
+
+def search(text, user, limit, offset=0):
+    """
+    Возвращает (rows, has_more), rows - список (kind, id, rank) по убыванию релевантности.
+    Каждое слово запроса ищется как префикс, все слова должны найтись.
+    """
+    words = query_words(text)
+    if not words:
+        return [], False
+    owner_id = user.id if user.is_authenticated else None
+    if use_fts():
+        rows = _search_fts(words, owner_id, limit + 1, offset)
+    else:
+        rows = _search_postgres(words, owner_id, limit + 1, offset)
+    return rows[:limit], len(rows) > limit
+
+
+def _search_fts(words, owner_id, limit, offset):
+    match = ' AND '.join('"{}"*'.format(word.replace('"', '')) for word in words)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({TABLE}, %s, 1.0) AS rank FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND (is_private = 0 OR owner_id = %s) '
+            f'ORDER BY rank LIMIT %s OFFSET %s',
+            [TITLE_WEIGHT, match, owner_id, limit, offset],
+        )
+        # bm25 тем лучше, чем меньше; наружу отдаем "больше - релевантнее"
+        return [
+            (SERIES if rowid % 2 else MOVIE, rowid // 2, -rank)
+            for rowid, rank in cursor.fetchall()
+        ]
+
+
+def _search_postgres(words, owner_id, limit, offset):
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    query = SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=PG_CONFIG)
+    visible = Q(is_private=False)
+    if owner_id is not None:
+        visible |= Q(uploaded_by_id=owner_id)
+
+    movie_vector = (SearchVector('title', weight='A', config=PG_CONFIG)
+                    + SearchVector('description', weight='B', config=PG_CONFIG))
+    series_vector = (SearchVector('title', weight='A', config=PG_CONFIG)
+                     + SearchVector('description', StringAgg('episodes__title', ' ', default=''),
+                                    weight='B', config=PG_CONFIG))
+
+    # Берем с запасом из обеих таблиц и сливаем по рангу
+    window = offset + limit
+    movies = (Movie.objects.filter(visible).annotate(document=movie_vector).filter(document=query)
+              .annotate(rank=SearchRank(movie_vector, query)).order_by('-rank', '-id')
+              .values_list('id', 'rank')[:window])
+    series = (Series.objects.filter(visible).annotate(document=series_vector).filter(document=query)
+              .annotate(rank=SearchRank(series_vector, query)).order_by('-rank', '-id')
+              .values_list('id', 'rank')[:window])
+    rows = [(MOVIE, pk, rank) for pk, rank in movies] + [(SERIES, pk, rank) for pk, rank in series]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[offset:window]
@@ -1,9 +1,60 @@
+from functools import partial
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Movie, Room, Message, UserData, UserProfile, Series, Episode
+from .models import Movie, Room, Message, UserData, UserProfile, Series, Episode, Upload
+from . import avatars, derivatives, media_pipeline, presence, uploads
+
+
+def query_list(request, name):
+    """Значения параметра через запятую: ?fields=id,name -> {'id', 'name'}."""
+    if request is None:
+        return set()
+    value = request.query_params.get(name, '')
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Разреженные ответы для GET-запросов:
+    ?fields=a,b - оставить только перечисленные поля;
+    ?expand=x - развернуть вложенный объект из Meta.expandable_fields (по умолчанию там id).
+    Действует только на сериализатор верхнего уровня (у вложенных нет request в контексте).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+
+        expand = query_list(request, 'expand')
+        for name, serializer_class in getattr(self.Meta, 'expandable_fields', {}).items():
+            if name in expand:
+                self.fields[name] = serializer_class(read_only=True)
+
+        fields = query_list(request, 'fields')
+        if fields:
+            for name in set(self.fields) - fields - expand:
+                self.fields.pop(name)
 
 # --- Сериализаторы пользователя ---
 
+class DerivativeImageField(serializers.ImageField):
+    """Принимает картинку как обычный ImageField, а отдает ссылку на ее уменьшенную копию (derivatives.py)."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = derivatives.url(value.name, self.variant)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Базовый сериализатор для User"""
     class Meta:
@@ -19,6 +70,7 @@ class UserDataSerializer(serializers.ModelSerializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    photo = DerivativeImageField('card', required=False, allow_null=True)
     
     class Meta:
         model = UserProfile
@@ -31,23 +83,114 @@ class EpisodeSerializer(serializers.ModelSerializer):
         model = Episode
         fields = ['id', 'number', 'title', 'video']
 
-class SeriesSerializer(serializers.ModelSerializer):
+class SeriesSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # Включаем список эпизодов внутрь сериала
     episodes = EpisodeSerializer(many=True, read_only=True)
+    image = DerivativeImageField('full', required=False)
     
     class Meta:
         model = Series
         fields = ['id', 'title', 'description', 'image', 'episodes', 'is_private']
 
-class MovieSerializer(serializers.ModelSerializer):
+class SeriesCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Сериал в списке: без эпизодов, только их количество (?expand=episodes - полный список)."""
+    episodes_count = serializers.SerializerMethodField()
+    image = DerivativeImageField('card', read_only=True)
+
+    class Meta:
+        model = Series
+        fields = ['id', 'title', 'image', 'is_private', 'episodes_count']
+        expandable_fields = {'episodes': partial(EpisodeSerializer, many=True)}
+
+    def get_episodes_count(self, obj):
+        # SeriesViewSet аннотирует количество в том же запросе
+        if hasattr(obj, 'episodes_total'):
+            return obj.episodes_total
+        # Внутри комнаты эпизоды уже подгружены prefetch_related
+        return len(obj.episodes.all())
+
+class MovieSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    image = DerivativeImageField('full', required=False)
+
     class Meta:
         model = Movie
         fields = '__all__' # Отдаем все поля фильма
+        read_only_fields = ['hls_status', 'hls_playlist']  # Их ведет media_pipeline
+
+class MovieCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Фильм в списке: то, что рисует MovieCard, без описания и ссылок на видео."""
+    image = DerivativeImageField('card', read_only=True)
+
+    class Meta:
+        model = Movie
+        fields = ['id', 'title', 'category', 'image', 'poster_url', 'is_private']
+
+
+# === ЛОГИКА ВЫБОРА КОНТЕНТА КОМНАТЫ ===
+# Общая для полной комнаты и карточки в лобби
+
+def room_video_url(room):
+    # 1. Если выбран сериал и серия -> отдаем видео серии (HLS, когда нарезка готова)
+    if room.active_episode and room.active_episode.video:
+        return media_pipeline.playlist_url(room.active_episode) or room.active_episode.video.url
+    # 2. Если выбран фильм (загруженный файл)
+    if room.video and room.video.video:
+        return media_pipeline.playlist_url(room.video) or room.video.video.url
+    # 3. Если выбран фильм (ссылка)
+    if room.video and room.video.video_url:
+        return room.video.video_url
+    return None
+
+def room_video_fallback_url(room):
+    # Исходный mp4 для браузеров без HLS; None, если current_video_url и так не плейлист
+    if room.active_episode and room.active_episode.video:
+        item = room.active_episode
+    elif room.video and room.video.video:
+        item = room.video
+    else:
+        return None
+    return item.video.url if media_pipeline.playlist_url(item) else None
+
+def room_poster_name(room):
+    # Файл постера: 1. сериала, 2. фильма; None, если постер - внешняя ссылка или его нет
+    if room.active_series and room.active_series.image:
+        return room.active_series.image.name
+    if room.video and room.video.image:
+        return room.video.image.name
+    return None
 
-class RoomSerializer(serializers.ModelSerializer):
+def room_poster_url(room, variant='full'):
+    # 1-2. Файл постера (уменьшенная копия, см. derivatives.py)
+    name = room_poster_name(room)
+    if name:
+        return derivatives.url(name, variant)
+    # 3. Постер фильма (ссылка)
+    if room.video and room.video.poster_url:
+        return room.video.poster_url
+    return None
+
+def room_title(room):
+    if room.active_series:
+        ep_num = room.active_episode.number if room.active_episode else '?'
+        return f"{room.active_series.title} (Серия {ep_num})"
+    if room.video:
+        return room.video.title
+    return None
+
+def room_participants_count(room):
+    # Живое присутствие из памяти; если процесс его не ведет - из сверенной таблицы
+    count = presence.participants_count(room.name)
+    if count is not None:
+        return count
+    # RoomViewSet аннотирует количество в том же запросе
+    if hasattr(room, 'participants_total'):
+        return room.participants_total
+    return room.participants.count()
+
+class RoomSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     owner_name = serializers.ReadOnlyField(source='owner.username')
     is_protected = serializers.SerializerMethodField()
-    participants_count = serializers.IntegerField(source='participants.count', read_only=True)
+    participants_count = serializers.SerializerMethodField()
     
     # Вложенные объекты (чтобы фронт знал, что именно играет)
     active_series = SeriesSerializer(read_only=True)
@@ -55,6 +198,7 @@ class RoomSerializer(serializers.ModelSerializer):
     
     # Умные поля (вычисляются на лету)
     current_video_url = serializers.SerializerMethodField()
+    current_video_fallback_url = serializers.SerializerMethodField()
     current_poster_url = serializers.SerializerMethodField()
     current_title = serializers.SerializerMethodField()
 
@@ -66,7 +210,8 @@ class RoomSerializer(serializers.ModelSerializer):
             'video',          # Объект фильма (если выбран фильм)
             'active_series',  # Объект сериала (если выбран сериал)
             'active_episode', # Текущая серия
-            'current_video_url', 'current_poster_url', 'current_title', # <-- Умные поля
+            'current_video_url', 'current_video_fallback_url',
+            'current_poster_url', 'current_title', # <-- Умные поля
             'participants_count', 'is_protected', 'password'
         ]
         read_only_fields = ['owner']
@@ -75,39 +220,77 @@ class RoomSerializer(serializers.ModelSerializer):
     def get_is_protected(self, obj):
         return bool(obj.password and obj.password.strip())
 
-    # === ЛОГИКА ВЫБОРА КОНТЕНТА ===
-    
+    def get_participants_count(self, obj):
+        return room_participants_count(obj)
+
     def get_current_video_url(self, obj):
-        # 1. Если выбран сериал и серия -> отдаем видео серии
-        if obj.active_episode and obj.active_episode.video:
-            return obj.active_episode.video.url
-        # 2. Если выбран фильм (загруженный файл)
-        if obj.video and obj.video.video:
-            return obj.video.video.url
-        # 3. Если выбран фильм (ссылка)
-        if obj.video and obj.video.video_url:
-            return obj.video.video_url
-        return None
+        return room_video_url(obj)
+
+    def get_current_video_fallback_url(self, obj):
+        return room_video_fallback_url(obj)
 
     def get_current_poster_url(self, obj):
-        # 1. Постер сериала
-        if obj.active_series and obj.active_series.image:
-            return obj.active_series.image.url
-        # 2. Постер фильма (файл)
-        if obj.video and obj.video.image:
-            return obj.video.image.url
-        # 3. Постер фильма (ссылка)
-        if obj.video and obj.video.poster_url:
-            return obj.video.poster_url
-        return None
+        return room_poster_url(obj)
 
     def get_current_title(self, obj):
-        if obj.active_series:
-            ep_num = obj.active_episode.number if obj.active_episode else '?'
-            return f"{obj.active_series.title} (Серия {ep_num})"
-        if obj.video:
-            return obj.video.title
-        return "Ничего не выбрано"
+        return room_title(obj) or "Ничего не выбрано"
+
+class RoomCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Комната в лобби: название, владелец, что играет, постер и заполненность.
+    Фильм, сериал и серия отдаются как id; ?expand=video,active_series,active_episode
+    разворачивает их в объекты.
+    """
+    owner_name = serializers.ReadOnlyField(source='owner.username')
+    is_protected = serializers.SerializerMethodField()
+    participants_count = serializers.SerializerMethodField()
+    video_title = serializers.SerializerMethodField()
+    video_poster = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Room
+        fields = [
+            'id', 'name', 'owner_name', 'max_participants',
+            'video', 'active_series', 'active_episode',
+            'video_title', 'video_poster',
+            'participants_count', 'is_protected',
+        ]
+        expandable_fields = {
+            'video': MovieCardSerializer,
+            'active_series': SeriesCardSerializer,
+            'active_episode': EpisodeSerializer,
+        }
+
+    def get_is_protected(self, obj):
+        return bool(obj.password and obj.password.strip())
+
+    def get_participants_count(self, obj):
+        return room_participants_count(obj)
+
+    def get_video_title(self, obj):
+        return room_title(obj)
+
+    def get_video_poster(self, obj):
+        return room_poster_url(obj, 'card')
+
+class UploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ['id', 'filename', 'size', 'offset', 'checksum', 'status', 'movie', 'created_at']
+        read_only_fields = ['offset', 'status', 'movie', 'created_at']
+
+    def validate_size(self, value):
+        if value <= 0 or value > uploads.max_size():
+            raise serializers.ValidationError(f'Размер файла должен быть от 1 до {uploads.max_size()} байт')
+        return value
+
+class MessageListSerializer(serializers.ListSerializer):
+    """Перед сериализацией списка получает аватарки всех авторов одним запросом."""
+
+    def to_representation(self, data):
+        messages = list(data.all() if hasattr(data, 'all') else data)
+        avatars.get_avatars({message.user_id for message in messages})
+        return super().to_representation(messages)
 
 class MessageSerializer(serializers.ModelSerializer):
     user_name = serializers.ReadOnlyField(source='user.username')
@@ -119,25 +302,18 @@ class MessageSerializer(serializers.ModelSerializer):
         # Не забудь добавить 'user_avatar' сюда
         fields = ['id', 'room', 'user', 'user_name', 'user_avatar', 'content', 'timestamp']
         read_only_fields = ['timestamp', 'user']
+        list_serializer_class = MessageListSerializer
 
-    # Метод для получения ссылки на фото
+    # Метод для получения ссылки на фото (через общий кэш аватарок)
     def get_user_avatar(self, obj):
-        if hasattr(obj.user, 'user_profile') and obj.user.user_profile.photo:
-            url = obj.user.user_profile.photo.url
-            # === ИСПРАВЛЕНИЕ ===
-            # Если это заглушка 'default', возвращаем None, чтобы фронт рисовал букву
-            if 'default' in url:
-                return None
-            # ===================
-            return url
-        return None
+        return avatars.get_avatar(obj.user_id)
 
 class FullProfileSerializer(serializers.ModelSerializer):
     # Добавляем поля из связанных моделей
     age = serializers.IntegerField(source='user_data.age', required=False)
     country = serializers.CharField(source='user_data.country', required=False, allow_blank=True)
     gender = serializers.CharField(source='user_data.gender', required=False, allow_blank=True)
-    photo = serializers.ImageField(source='user_profile.photo', required=False)
+    photo = DerivativeImageField('card', source='user_profile.photo', required=False)
     
     class Meta:
         model = User
@@ -170,7 +346,13 @@ class FullProfileSerializer(serializers.ModelSerializer):
             user_profile, created = UserProfile.objects.get_or_create(user=instance)
             
             if 'photo' in user_profile_info:
+                old_photo = user_profile.photo.name if user_profile.photo else None
                 user_profile.photo = user_profile_info['photo']
                 user_profile.save()
+                # Замененное фото больше нигде не используется - удаляем файл (заглушку не трогаем).
+                # Его уменьшенные копии уберет sweep_media
+                if old_photo and old_photo != user_profile.photo.name and 'default' not in old_photo:
+                    user_profile.photo.storage.delete(old_photo)
+                    derivatives.forget(old_photo)
 
         return instance
\ No newline at end of file
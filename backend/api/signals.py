@@ -0,0 +1,86 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import avatars, blobs, catalog_cache, derivatives, media_pipeline, search
+from .models import Episode, Movie, Series, UserProfile
+
+"""
+signals.py
+Сброс кэшей при изменении моделей. Подключается в ApiConfig.ready().
+"""
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def reset_avatar_cache(sender, instance, **kwargs):
+    avatars.invalidate(instance.user_id)
+
+
+# Уменьшенные копии картинок (api/derivatives.py) режутся сразу после загрузки
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Series)
+def warm_poster(sender, instance, **kwargs):
+    if instance.image:
+        derivatives.warm(instance.image.name, ('card', 'full'))
+
+
+@receiver(post_save, sender=UserProfile)
+def warm_photo(sender, instance, **kwargs):
+    if instance.photo:
+        derivatives.warm(instance.photo.name, ('thumb', 'card'))
+
+
+@receiver([post_save, post_delete], sender=Movie)
+@receiver([post_save, post_delete], sender=Series)
+@receiver([post_save, post_delete], sender=Episode)
+def reset_catalog_cache(sender, instance, **kwargs):
+    catalog_cache.bump()
+
+
+# Индекс поиска (api/search.py) обновляется точечно, по одной записи
+@receiver(post_save, sender=Movie)
+def index_movie(sender, instance, **kwargs):
+    search.index_movie(instance)
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_movie(sender, instance, **kwargs):
+    search.unindex_movie(instance.id)
+
+
+@receiver(post_save, sender=Series)
+def index_series(sender, instance, **kwargs):
+    search.index_series(instance.id)
+
+
+@receiver(post_delete, sender=Series)
+def unindex_series(sender, instance, **kwargs):
+    search.unindex_series(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Episode)
+def reindex_episode_series(sender, instance, **kwargs):
+    # Названия серий ищутся в составе сериала
+    search.index_series(instance.series_id)
+
+
+# Нарезка в HLS (api/media_pipeline.py): серия ставится в очередь при сохранении с новым файлом
+@receiver(post_save, sender=Episode)
+def enqueue_episode_hls(sender, instance, **kwargs):
+    media_pipeline.enqueue('episode', instance)
+
+
+@receiver(post_delete, sender=Movie)
+def discard_movie_hls(sender, instance, **kwargs):
+    media_pipeline.discard('movie', instance.id)
+
+
+@receiver(post_delete, sender=Episode)
+def discard_episode_hls(sender, instance, **kwargs):
+    media_pipeline.discard('episode', instance.id)
+
+
+# Файл загруженного фильма общий для всех его копий (api/blobs.py): удаляется на последней ссылке
+@receiver(post_delete, sender=Movie)
+def release_movie_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        blobs.release(instance.blob_id)
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import avatars, uploads
+from .management.commands.bench_upload import current_rss, patch_chunk
+from .middleware import StaticFilesMiddleware
+from .models import Episode, Message, Movie, Room, Series, Upload, UserProfile, VideoBlob
+
+"""
+tests.py
+Бюджет SQL-запросов на списки лобби и истории чата: число запросов фиксировано
+и не растет вместе с числом комнат и сообщений (регрессия N+1 ловится здесь, а не в проде).
+Тот же замер на большом каталоге - manage.py bench_queries.
+Протокол докачиваемой загрузки (uploads.py) и память при потоковой записи частей -
+уменьшенная версия manage.py bench_upload.
+StaticFilesMiddleware: async-ветка отдает статику через публичный API WhiteNoise
+(его версия закреплена в requirements.txt) и не трогает остальные запросы.
+"""
+
+ROOMS_QUERIES = 1     # комнаты со всеми связями и числом участников одним JOIN
+MESSAGES_QUERIES = 3  # id комнаты + страница сообщений с авторами + профили авторов (аватарки)
+UPLOAD_SIZE = 64 * 1024 * 1024  # разреженный файл для замера RSS
+UPLOAD_CHUNK = 4 * 1024 * 1024
+UPLOAD_RSS_LIMIT = 16 * 1024 * 1024  # заметно меньше файла: рост вместе с размером не пройдет
+CHAT_ROOM = 'Чат'
+
+
+@override_settings(MEDIA_WORKERS=0, IMAGE_DERIVATIVES=False)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        avatars._cache.clear()
+        self.user = User.objects.create_user('owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.chat = Room.objects.create(name=CHAT_ROOM, owner=self.user)
+
+    def seed(self, count):
+        start = Room.objects.count()
+        for i in range(start, start + count):
+            movie = Movie.objects.create(title=f'Фильм {i}', description='...', uploaded_by=self.user)
+            series = Series.objects.create(title=f'Сериал {i}', description='...')
+            episode = Episode.objects.create(series=series, number=1, title='Серия 1', video=f'episodes/{i}.mp4')
+            room = Room.objects.create(
+                name=f'Комната {i}', owner=self.user,
+                video=movie if i % 2 else None,
+                active_series=None if i % 2 else series,
+                active_episode=None if i % 2 else episode,
+            )
+            room.participants.add(self.user)
+
+            author = User.objects.create_user(f'author_{i}')
+            UserProfile.objects.create(user=author, photo=f'user_photos/{i}.jpg')
+            Message.objects.create(room=self.chat, user=author, content=f'Сообщение {i}')
+
+    def assert_budget(self, url, params, budget):
+        for count in (2, 10):
+            self.seed(count)
+            avatars._cache.clear()
+            with self.subTest(records=Room.objects.count()), self.assertNumQueries(budget):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+
+    def test_room_list(self):
+        self.assert_budget('/api/rooms/', {}, ROOMS_QUERIES)
+
+    def test_message_list(self):
+        self.assert_budget('/api/messages/', {'room': CHAT_ROOM}, MESSAGES_QUERIES)
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings = override_settings(
+            MEDIA_ROOT=self.media,
+            MEDIA_QUARANTINE_DIR=os.path.join(self.media, 'quarantine'),
+            UPLOAD_TEMP_DIR=os.path.join(self.media, 'uploads'),
+            FILE_UPLOAD_TEMP_DIR=os.path.join(self.media, 'uploads', 'tmp'),
+            MEDIA_WORKERS=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('uploader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = b'0123456789' * 100
+
+    def start(self, size=None, checksum=None):
+        data = {'filename': 'film.mp4', 'size': len(self.data) if size is None else size}
+        if checksum is not None:
+            data['checksum'] = checksum
+        response = self.client.post('/api/uploads/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return f"/api/uploads/{response.data['id']}/"
+
+    def patch(self, url, offset, data):
+        return self.client.generic('PATCH', url, data, content_type='application/offset+octet-stream',
+                                   HTTP_UPLOAD_OFFSET=str(offset))
+
+    def finalize(self, url, checksum=None):
+        return self.client.post(url + 'finalize/', {'checksum': checksum or sha256(self.data)}, format='json')
+
+    def complete(self):
+        url = self.start()
+        self.assertEqual(self.patch(url, 0, self.data).status_code, 200)
+        response = self.finalize(url)
+        self.assertEqual(response.status_code, 200)
+        return url, response.data
+
+    def test_offset_mismatch(self):
+        url = self.start()
+        self.assertEqual(self.patch(url, 0, self.data[:300]).status_code, 200)
+        response = self.patch(url, 100, self.data[100:400])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 300)
+        # Клиент продолжает с offset из ответа
+        self.assertEqual(self.patch(url, 300, self.data[300:]).status_code, 200)
+
+    def test_patch_after_finalize(self):
+        url, _ = self.complete()
+        response = self.patch(url, len(self.data), b'x')
+        self.assertEqual(response.status_code, 409)
+
+    def test_patch_after_expiry(self):
+        url = self.start()
+        self.assertEqual(self.patch(url, 0, self.data[:300]).status_code, 200)
+        Upload.objects.update(updated_at=timezone.now() - timedelta(seconds=uploads.expiry() + 60))
+        response = self.patch(url, 300, self.data[300:])
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(Upload.objects.get().offset, 300)
+
+    def test_checksum_mismatch(self):
+        url = self.start()
+        self.assertEqual(self.patch(url, 0, self.data).status_code, 200)
+        response = self.finalize(url, checksum=sha256(b'other'))
+        self.assertEqual(response.status_code, 400)
+        # Испорченный файл удален, загрузка начинается заново
+        self.assertEqual(response.data['offset'], 0)
+        upload = Upload.objects.get()
+        self.assertEqual((upload.status, upload.offset), ('uploading', 0))
+        self.assertFalse(os.path.exists(uploads.temp_path(upload)))
+        self.assertFalse(Movie.objects.exists())
+
+    def test_finalize_is_idempotent(self):
+        url, first = self.complete()
+        second = self.finalize(url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['movie'], first['movie'])
+        self.assertEqual(Movie.objects.count(), 1)
+
+    def test_attach_is_single_use(self):
+        _, data = self.complete()
+        response = self.client.post('/api/rooms/', {'name': 'Первая', 'upload_id': data['id']})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Room.objects.get(name='Первая').video_id, data['movie'])
+
+        response = self.client.post('/api/rooms/', {'name': 'Вторая', 'upload_id': data['id']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('upload_id', response.data)
+        self.assertFalse(Room.objects.filter(name='Вторая').exists())
+        with self.assertRaises(uploads.UploadError):
+            uploads.attach(data['id'], self.user)
+
+    def test_failed_room_releases_blob(self):
+        video = SimpleUploadedFile('film.mp4', self.data)
+        # captureOnCommitCallbacks: файл blob удаляется после коммита (blobs.release)
+        with mock.patch('api.media_pipeline.enqueue', side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/rooms/', {'name': 'Комната', 'video_file': video}, format='multipart')
+        self.assertFalse(Room.objects.exists())
+        self.assertFalse(Movie.objects.exists())
+        self.assertFalse(VideoBlob.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(os.path.join(self.media, 'blobs')) if files], [])
+
+    def test_memory_does_not_grow_with_file(self):
+        source = os.path.join(self.media, 'source.bin')
+        with open(source, 'wb') as f:
+            f.truncate(UPLOAD_SIZE)  # разреженный файл: место на диске не занимает
+        url = self.start(size=UPLOAD_SIZE)
+        client = APIClient()
+        client.force_login(self.user)
+        session = client.cookies['sessionid'].value
+
+        # Как в bench_upload: тело-поток из файла через WSGIHandler, без буфера тестового клиента
+        handler = WSGIHandler()
+        baseline = None
+        peak = 0
+        with open(source, 'rb') as f:
+            for offset in range(0, UPLOAD_SIZE, UPLOAD_CHUNK):
+                f.seek(offset)
+                status, body = patch_chunk(handler, url, f, offset, UPLOAD_CHUNK, session)
+                self.assertEqual(status, 200, body)
+                rss = current_rss()
+                baseline = rss if baseline is None else baseline
+                peak = max(peak, rss)
+
+        self.assertEqual(body['offset'], UPLOAD_SIZE)
+        self.assertLess(peak - baseline, UPLOAD_RSS_LIMIT)
+        self.assertEqual(os.path.getsize(uploads.temp_path(Upload.objects.get())), UPLOAD_SIZE)
+
+
+class StaticFilesMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.static_root.cleanup)
+        with open(os.path.join(self.static_root.name, 'app.js'), 'wb') as f:
+            f.write(b'console.log(1)')
+        settings = override_settings(STATIC_URL='/static/', STATIC_ROOT=self.static_root.name, DEBUG=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.factory = RequestFactory()
+
+    def make(self, get_response):
+        middleware = StaticFilesMiddleware(get_response)
+        # async-цепочку гоняем через async_to_sync, как ее вызвал бы ASGI-обработчик
+        return async_to_sync(middleware) if iscoroutinefunction(middleware) else middleware
+
+    def check(self, get_response):
+        middleware = self.make(get_response)
+        response = middleware(self.factory.get('/static/app.js'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'console.log(1)')
+        self.assertEqual(middleware(self.factory.get('/static/missing.js')).content, b'next')
+        self.assertEqual(middleware(self.factory.get('/api/rooms/')).content, b'next')
+
+    def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse(b'next')
+        self.check(get_response)
+
+    def test_sync_chain(self):
+        self.check(lambda request: HttpResponse(b'next'))
+
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+"""
+throttling.py
+Защита комнаты от потока событий плеера.
+TokenBucket - лимит событий на одно соединение (лишние события отбрасываются).
+EventCoalescer - склейка частых seek/sync в комнате: в течение окна копится только
+последнее событие, и в конце окна (по заднему фронту) рассылается оно одно.
+"""
+
+RATE_LIMIT = getattr(settings, 'PLAYER_RATE_LIMIT', 30)
+RATE_BURST = getattr(settings, 'PLAYER_RATE_BURST', 60)
+COALESCE_WINDOW = getattr(settings, 'PLAYER_COALESCE_WINDOW', 0.25)
+
+
+class TokenBucket:
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def allow(self, cost=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class EventCoalescer:
+    """
+    Окно открывается первым событием и длится window секунд; каждое следующее
+    событие окна заменяет предыдущее. Так при перемотке ползунком комната получает
+    позицию не чаще раза в окно, но конечная позиция не теряется.
+    """
+
+    def __init__(self, window=COALESCE_WINDOW):
+        self.window = window
+        self._pending = {}  # key -> (send, event)
+        self._timers = {}   # key -> TimerHandle
+
+    async def submit(self, key, event, send):
+        """send - корутинная функция, которой будет отправлено итоговое событие."""
+        if self.window <= 0:
+            await send(event)
+            return
+
+        if key in self._pending:
+            metrics.incr('player.coalesced')
+        else:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.window, lambda: loop.create_task(self.flush(key)))
+        self._pending[key] = (send, event)
+
+    async def flush(self, key):
+        """Отправляет накопленное событие сразу (например, перед play/pause)."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            send, event = pending
+            await send(event)
+
+
+seek_coalescer = EventCoalescer()
@@ -0,0 +1,171 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import blobs
+from .models import Movie, Upload
+
+"""
+uploads.py
+Докачиваемая загрузка видео частями, без буферизации файла целиком.
+
+1. POST /api/uploads/ {filename, size[, checksum]} - заводим загрузку;
+2. PATCH /api/uploads/<id>/ с заголовком Upload-Offset и сырыми байтами в теле -
+   часть дописывается в файл на диске кусками по CHUNK_READ_SIZE;
+   после обрыва GET /api/uploads/<id>/ говорит, с какого offset продолжать;
+3. POST /api/uploads/<id>/finalize/ [{checksum, title}] - сверяем sha256 (файл читается
+   потоком), переносим файл в хранилище media/blobs/ (см. blobs.py) и создаем приватный Movie.
+Комната подключает готовое видео через upload_id в RoomViewSet (attach): одна загрузка -
+одна комната, иначе удаление одной комнаты вместе с ее фильмом сломало бы остальные.
+Недокачанная загрузка без новых частей дольше UPLOAD_EXPIRY считается брошенной:
+expire_stale() (manage.py cleanup_rooms) удаляет ее вместе с .part, sweep_media ее файл не бережет.
+"""
+
+CHUNK_READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 20 * 1024 ** 3)
+
+
+def expiry():
+    return getattr(settings, 'UPLOAD_EXPIRY', 7 * 24 * 3600)
+
+
+def expiry_cutoff():
+    """Недокачанные загрузки, не обновлявшиеся с этого момента, брошены."""
+    return timezone.now() - timedelta(seconds=expiry())
+
+
+def temp_dir():
+    return getattr(settings, 'UPLOAD_TEMP_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'uploads')
+
+
+def temp_path(upload):
+    return os.path.join(temp_dir(), f'{upload.id}.part')
+
+
+def append_chunk(upload, offset, stream, length):
+    """
+    Дописывает length байт из stream с позиции offset. Возвращает новый offset.
+    Часть должна начинаться ровно там, где закончилась предыдущая.
+    """
+    if upload.status != 'uploading':
+        raise UploadError('Загрузка уже завершена', status=409)
+    if upload.updated_at < expiry_cutoff():
+        # Ее .part мог уже удалить sweep_media: дописывать некуда
+        raise UploadError('Загрузка просрочена, начните заново', status=410)
+    if offset != upload.offset:
+        raise UploadError(f'Ожидается offset {upload.offset}', status=409)
+    if length <= 0 or offset + length > upload.size:
+        raise UploadError('Часть выходит за объявленный размер файла')
+
+    os.makedirs(temp_dir(), exist_ok=True)
+    path = temp_path(upload)
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as target:
+        target.seek(offset)
+        while written < length:
+            data = stream.read(min(CHUNK_READ_SIZE, length - written))
+            if not data:
+                break
+            target.write(data)
+            written += len(data)
+        # Хвост от оборванной раньше попытки не должен попасть в файл
+        target.truncate(offset + written)
+
+    new_offset = offset + written
+    # Сравнение с прежним offset защищает от двух одновременных PATCH одной загрузки
+    # update() не трогает auto_now: updated_at продлеваем сами, по нему считается срок жизни
+    now = timezone.now()
+    updated = Upload.objects.filter(id=upload.id, offset=offset).update(offset=new_offset, updated_at=now)
+    if not updated:
+        raise UploadError('Загрузка изменилась параллельно, запросите offset заново', status=409)
+    upload.offset, upload.updated_at = new_offset, now
+    if written < length:
+        raise UploadError(f'Тело запроса короче Content-Length, сохранено до offset {new_offset}')
+    return new_offset
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(CHUNK_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(upload, checksum='', title=''):
+    """Проверяет файл и создает из него приватный Movie. Повторный вызов вернет тот же фильм."""
+    if upload.status in ('complete', 'attached'):
+        return upload.movie
+    if upload.offset != upload.size:
+        raise UploadError(f'Файл загружен не полностью: {upload.offset} из {upload.size}', status=409)
+
+    expected = (checksum or upload.checksum).lower()
+    if not expected:
+        raise UploadError('Нужна контрольная сумма sha256')
+    path = temp_path(upload)
+    if file_sha256(path) != expected:
+        # Содержимое испорчено: начинаем загрузку заново
+        os.remove(path)
+        Upload.objects.filter(id=upload.id).update(offset=0)
+        upload.offset = 0
+        raise UploadError('Контрольная сумма не совпала, загрузите файл заново')
+
+    # sha256 уже посчитан: файл переносится в хранилище blobs (или удаляется, если такой уже есть)
+    blob = blobs.store_path(path, expected, upload.filename)
+
+    movie = Movie.objects.create(
+        title=title or f"Загрузка: {upload.filename}",
+        description="Загруженное видео",
+        video=blob.file.name,
+        blob=blob,
+        category='A',
+        uploaded_by=upload.owner,
+        is_private=True,
+    )
+    upload.status = 'complete'
+    upload.checksum = expected
+    upload.movie = movie
+    upload.save(update_fields=['status', 'checksum', 'movie', 'updated_at'])
+    return movie
+
+
+def abort(upload):
+    """Отмена загрузки: удаляем недокачанный файл."""
+    path = temp_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def attach(upload_id, owner):
+    """
+    Забирает фильм завершенной загрузки для новой комнаты. Условный UPDATE: из двух
+    одновременных запросов с одним upload_id фильм получит только один.
+    """
+    claimed = Upload.objects.filter(id=upload_id, owner=owner, status='complete', movie__isnull=False).update(
+        status='attached', updated_at=timezone.now(),
+    )
+    if not claimed:
+        raise UploadError('Загрузка не найдена, не завершена или уже подключена к комнате')
+    return Upload.objects.select_related('movie').get(id=upload_id).movie
+
+
+def expire_stale():
+    """Удаляет брошенные недокачанные загрузки и их файлы. Возвращает их число."""
+    count = 0
+    for upload in Upload.objects.filter(status='uploading', updated_at__lt=expiry_cutoff()).iterator():
+        abort(upload)
+        upload.delete()
+        count += 1
+    return count
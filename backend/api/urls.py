@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import api_views  # Вьюсеты (MovieViewSet, etc)
 from . import views      # Обычные функции (api_login, api_signup)
+from . import async_views  # Быстрые async-чтения комнаты (состояние, участники, контент)
 
 # Создаем роутер и регистрируем ViewSet
 router = DefaultRouter()
@@ -9,9 +10,15 @@ router.register(r'movies', api_views.MovieViewSet)
 router.register(r'series', api_views.SeriesViewSet)
 router.register(r'rooms', api_views.RoomViewSet)
 router.register(r'messages', api_views.MessageViewSet)
+router.register(r'uploads', api_views.UploadViewSet, basename='upload')
 
 urlpatterns = [
-    # 1. Сначала подключаем пути Роутера (api/movies/, api/rooms/)
+    # 0. Горячие чтения комнаты - раньше роутера, без стека DRF
+    path('rooms/<str:name>/state/', async_views.room_state, name='room_state'),
+    path('rooms/<str:name>/participants/', async_views.room_participants, name='room_participants'),
+    path('rooms/<str:name>/content/', async_views.room_content, name='room_content'),
+
+    # 1. Пути Роутера (api/movies/, api/rooms/)
     path('', include(router.urls)),
 
     # 2. Добавляем наши пути авторизации
@@ -19,4 +26,6 @@ urlpatterns = [
     path('auth/signup/', views.api_signup, name='api_signup'),
     path('auth/logout/', views.api_logout, name='api_logout'),
     path('profile/me/', api_views.UserProfileView.as_view(), name='user_profile'),
+    path('search/', api_views.SearchView.as_view(), name='search'),
+    path('stats/realtime/', api_views.RealtimeStatsView.as_view(), name='realtime_stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,111 @@
+import asyncio
+import atexit
+import threading
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import F
+
+from .background import PeriodicTask
+from .models import Movie, Series
+
+"""
+view_counter.py
+Подсчет просмотров фильмов и сериалов без записи в БД на каждый просмотр.
+Просмотры копятся в памяти процесса и раз в FLUSH_INTERVAL уходят атомарными
+UPDATE ... SET views_count = views_count + n: объекты с одинаковым приростом
+обновляются одним запросом.
+
+Просмотр засчитывается:
+- при открытии фильма (MovieViewSet.retrieve);
+- при первом play в комнате для текущего контента (фильм или серия сериала):
+  повторные play/pause того же контента не считаются.
+"""
+
+FLUSH_INTERVAL = getattr(settings, 'VIEW_FLUSH_INTERVAL', 10.0)
+MOVIE, SERIES = 'movie', 'series'
+MODELS = {MOVIE: Movie, SERIES: Series}
+
+_pending = {}  # (kind, id) -> сколько просмотров накопилось
+_lock = threading.Lock()  # record вызывается и из потоков синхронных view
+_last_flush = time.monotonic()
+_room_content = {}  # room_name -> контент, просмотр которого уже засчитан в этой комнате
+
+
+def record(kind, object_id, amount=1):
+    with _lock:
+        key = (kind, object_id)
+        _pending[key] = _pending.get(key, 0) + amount
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Синхронный view: своего таймера нет, сбрасываем сами, когда интервал прошел
+        if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            _write(_take_pending())
+        return
+    _flusher.ensure_running()
+
+
+def record_room_play(room_name, room_state):
+    """Засчитывает просмотр контента комнаты, если для него это первый play."""
+    if room_state is None:
+        return
+    if room_state.active_episode_id:
+        content = (SERIES, room_state.active_series_id, room_state.active_episode_id)
+    elif room_state.video_id:
+        content = (MOVIE, room_state.video_id, None)
+    else:
+        return
+    if _room_content.get(room_name) == content:
+        return
+    _room_content[room_name] = content
+    kind, object_id, _episode_id = content
+    if object_id:
+        record(kind, object_id)
+
+
+def evict(room_name):
+    _room_content.pop(room_name, None)
+
+
+def _take_pending():
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    return pending
+
+
+async def flush():
+    pending = _take_pending()
+    if pending:
+        await database_sync_to_async(_write)(pending)
+
+
+def _write(pending):
+    # {(kind, прирост): [id, ...]} -> один UPDATE на группу
+    groups = {}
+    for (kind, object_id), amount in pending.items():
+        groups.setdefault((kind, amount), []).append(object_id)
+    for (kind, amount), ids in groups.items():
+        # Каждая группа отдельно: ошибка в одной не теряет просмотры остальных
+        try:
+            MODELS[kind].objects.filter(id__in=ids).update(views_count=F('views_count') + amount)
+        except Exception as e:
+            print(f"🔥 Views flush error ({kind} +{amount}, {len(ids)} objects): {e}")
+            # Возвращаем в буфер: следующий сброс попробует еще раз
+            with _lock:
+                for object_id in ids:
+                    key = (kind, object_id)
+                    _pending[key] = _pending.get(key, 0) + amount
+
+
+@atexit.register
+def flush_on_exit():
+    _write(_take_pending())
+
+
+_flusher = PeriodicTask(FLUSH_INTERVAL, flush, name='views flush')
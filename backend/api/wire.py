@@ -0,0 +1,87 @@
+import itertools
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import fastjson
+
+try:
+    import msgpack
+except ImportError:  # msgpack ставится вместе с channels_redis, но он не обязателен
+    msgpack = None
+
+"""
+wire.py
+Кодирование кадров WebSocket плеера.
+По умолчанию - JSON (текстовые кадры). Клиент может выбрать MessagePack (бинарные
+кадры) через подпротокол 'filmhub.msgpack' или параметр ?format=msgpack.
+Схема событий одинаковая в обоих форматах. JSON кодируется через fastjson (orjson, если есть).
+Кадр для рассылки кладется в событие группы как есть, с уникальным frame_id.
+Кодирует его получатель, в формат своего сокета, и запоминает результат по (frame_id, формат):
+остальные сокеты процесса в том же формате пересылают готовые данные. Формат, которым
+в процессе никто не пользуется (обычно MessagePack), не кодируется вовсе.
+"""
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+MSGPACK_SUBPROTOCOL = 'filmhub.msgpack'
+
+# Если задан путь, входящие события пишутся туда построчно (JSONL) для бенчмарка bench_wire
+TRACE_PATH = getattr(settings, 'PLAYER_TRACE_PATH', None)
+
+ENCODED_CACHE_SIZE = 1024  # кадров: рассылка одного кадра по комнате занимает доли секунды
+
+_frame_ids = itertools.count()
+_process_id = uuid.uuid4().hex[:12]  # frame_id уникален и между процессами (события идут через Redis)
+_encoded = OrderedDict()  # (frame_id, формат) -> str или bytes
+
+
+def negotiate(scope):
+    """Возвращает (формат, подпротокол для accept()) по данным рукопожатия."""
+    if msgpack is None:
+        return JSON, None
+    if MSGPACK_SUBPROTOCOL in scope.get('subprotocols', []):
+        return MSGPACK, MSGPACK_SUBPROTOCOL
+    if b'format=msgpack' in scope.get('query_string', b'').split(b'&'):
+        return MSGPACK, None
+    return JSON, None
+
+
+def encode_frame(frame):
+    """Возвращает поля, которые добавляются в событие channel layer (кодирует их encoded())."""
+    return {'frame': frame, 'frame_id': f'{_process_id}:{next(_frame_ids)}'}
+
+
+def encoded(event, codec):
+    """Кадр события в формате codec: str для JSON, bytes для MessagePack."""
+    key = (event.get('frame_id'), codec)
+    data = _encoded.get(key)
+    if data is not None:
+        return data
+    if codec == MSGPACK:
+        data = msgpack.packb(event['frame'], use_bin_type=True)
+    else:
+        data = fastjson.dumps(event['frame'])
+    if key[0] is not None:
+        _encoded[key] = data
+        if len(_encoded) > ENCODED_CACHE_SIZE:
+            _encoded.popitem(last=False)
+    return data
+
+
+def decode(text_data=None, bytes_data=None):
+    if bytes_data is not None:
+        if msgpack is None:
+            raise ValueError('MessagePack не установлен')
+        data = msgpack.unpackb(bytes_data, raw=False)
+    else:
+        data = fastjson.loads(text_data)
+    if TRACE_PATH:
+        _record(data)
+    return data
+
+
+def _record(data):
+    with open(TRACE_PATH, 'a', encoding='utf-8') as trace:
+        trace.write(fastjson.dumps(data) + '\n')
@@ -8,6 +8,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 # Это загружает приложения и модели
 django_asgi_app = get_asgi_application()
 
+# Воркеры нарезки HLS сразу продолжают очередь, оставшуюся с прошлого запуска
+from api import media_pipeline
+media_pipeline.start_workers()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import api.routing 
@@ -64,6 +64,57 @@ else:
         }
     }
 
+# Общий кэш процессов (ответы каталога и их версия должны быть видны всем воркерам)
+if os.environ.get('REDIS_HOST'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f"redis://{os.environ.get('REDIS_HOST')}:6379/1",
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Сколько живет закэшированный ответ каталога (сек); версия каталога сбрасывает его раньше
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Как часто серверные часы плеера сохраняют позицию в Room.current_time (сек)
+PLAYBACK_FLUSH_INTERVAL = float(os.environ.get('PLAYBACK_FLUSH_INTERVAL', 5))
+
+# Отложенная запись чата: пачка сохраняется по размеру или по таймеру (сек)
+CHAT_FLUSH_BATCH_SIZE = int(os.environ.get('CHAT_FLUSH_BATCH_SIZE', 100))
+CHAT_FLUSH_INTERVAL = float(os.environ.get('CHAT_FLUSH_INTERVAL', 1))
+
+# Отложенная запись Room.last_activity (api/activity.py): одна пачка раз в интервал (сек)
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 30))
+
+# Просмотры (api/view_counter.py) пишутся пачкой раз в интервал (сек);
+# подборка "Most Watched" (api/rankings.py) пересчитывается раз в RANKING_INTERVAL (сек)
+VIEW_FLUSH_INTERVAL = float(os.environ.get('VIEW_FLUSH_INTERVAL', 10))
+RANKING_INTERVAL = float(os.environ.get('RANKING_INTERVAL', 300))
+RANKING_SIZE = int(os.environ.get('RANKING_SIZE', 50))
+
+# Лимит событий плеера на одно соединение (событий/сек и размер всплеска)
+PLAYER_RATE_LIMIT = float(os.environ.get('PLAYER_RATE_LIMIT', 30))
+PLAYER_RATE_BURST = int(os.environ.get('PLAYER_RATE_BURST', 60))
+# Окно склейки seek/sync в комнате (сек); 0 - отключить
+PLAYER_COALESCE_WINDOW = float(os.environ.get('PLAYER_COALESCE_WINDOW', 0.25))
+
+# Присутствие в комнатах (api/presence.py): снимок ноды в channel layer и сверка Room.participants (сек)
+PRESENCE_HEARTBEAT_INTERVAL = float(os.environ.get('PRESENCE_HEARTBEAT_INTERVAL', 10))
+PRESENCE_RECONCILE_INTERVAL = float(os.environ.get('PRESENCE_RECONCILE_INTERVAL', 60))
+
+# Запись входящих событий плеера в JSONL (для bench_wire). Пусто - не пишем
+PLAYER_TRACE_PATH = os.environ.get('PLAYER_TRACE_PATH') or None
+
+# Кэш ссылок на аватарки (api/avatars.py): размер LRU и время жизни записи (сек)
+AVATAR_CACHE_SIZE = int(os.environ.get('AVATAR_CACHE_SIZE', 10000))
+AVATAR_CACHE_TTL = int(os.environ.get('AVATAR_CACHE_TTL', 300))
+
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
@@ -74,7 +125,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise с async-веткой: синхронный оригинал переводил бы в поток каждый запрос (api/middleware.py)
+    'api.middleware.StaticFilesMiddleware',
 ]
 
 # Настройки REST Framework
@@ -88,6 +140,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # JSON через orjson, если он установлен (api/fastjson.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # CORS настройки
@@ -163,13 +225,71 @@ ASGI_APPLICATION = 'config.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# === БАЗА ДАННЫХ ===
+# DB_ENGINE=sqlite (по умолчанию) или postgres
+
+# SQLite под daphne: WAL (читатели не ждут писателя), synchronous=NORMAL (fsync только
+# на checkpoint), ожидание блокировки вместо "database is locked" и mmap для чтения.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    # Транзакция сразу берет блокировку записи: без взаимных блокировок при повышении с чтения
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
 }
 
+if os.environ.get('DB_ENGINE', 'sqlite') == 'postgres':
+    # Нужен psycopg 3: pip install "psycopg[binary,pool]"
+    POSTGRES = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'filmhub'),
+        'USER': os.environ.get('POSTGRES_USER', 'filmhub'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if os.environ.get('DB_POOL'):
+        # Пул psycopg на процесс; с пулом постоянные соединения Django должны быть выключены
+        POSTGRES['CONN_MAX_AGE'] = 0
+        POSTGRES['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+        }}
+    else:
+        # Соединение живет между запросами, а не открывается на каждый переход в поток
+        POSTGRES['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+    DATABASES = {'default': POSTGRES}
+
+    # Реплика для чтения каталога и истории чата (api/db_routers.py)
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **POSTGRES,
+            'HOST': os.environ.get('POSTGRES_REPLICA_HOST'),
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', POSTGRES['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+        # POST/PUT/PATCH/DELETE читают с основной базы: реплика может еще не видеть свежую запись
+        MIDDLEWARE.append('api.middleware.PrimaryDatabaseMiddleware')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': SQLITE_OPTIONS,
+            # Постоянное соединение: иначе каждый запрос заново открывает файл и выполняет PRAGMA из init_command
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        }
+    }
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
@@ -178,6 +298,43 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузка видео частями (api/uploads.py): предел размера файла и папка для недокачанных частей
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 20 * 1024 ** 3))
+UPLOAD_TEMP_DIR = os.environ.get('UPLOAD_TEMP_DIR') or os.path.join(MEDIA_ROOT, 'uploads')
+# Недокачанная загрузка без новых частей дольше этого срока удаляется (manage.py cleanup_rooms)
+UPLOAD_EXPIRY = int(os.environ.get('UPLOAD_EXPIRY', 7 * 24 * 3600))
+
+# Стандартные обработчики загрузки + sha256 на лету: по нему видео кладутся в хранилище без дублей (api/blobs.py)
+FILE_UPLOAD_HANDLERS = [
+    'api.blobs.HashingMemoryFileUploadHandler',
+    'api.blobs.HashingTemporaryFileUploadHandler',
+]
+# Временные файлы больших загрузок - на том же диске, что и media/: перенос в blobs/ будет переименованием,
+# а не копированием гигабайтов из /tmp (sweep_media удаляет брошенные)
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR') or os.path.join(MEDIA_ROOT, 'uploads', 'tmp')
+# Папку создает ApiConfig.ready() (api/apps.py): check files.E001 требует, чтобы она уже была
+
+# Куда sweep_media переносит файлы без ссылок (по умолчанию рядом с MEDIA_ROOT, чтобы не раздавались по /media/)
+MEDIA_QUARANTINE_DIR = os.environ.get('MEDIA_QUARANTINE_DIR') or MEDIA_ROOT + '_quarantine'
+
+# Уменьшенные копии постеров и аватарок (api/derivatives.py); 0 - отдавать оригиналы
+IMAGE_DERIVATIVES = os.environ.get('IMAGE_DERIVATIVES', '1') == '1'
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 80))
+
+# Нарезка загруженных видео в HLS (api/media_pipeline.py)
+# MEDIA_WORKERS - сколько роликов режется одновременно; 0 - не запускать воркеры в процессе
+# веб-сервера (тогда очередь разбирает отдельный процесс: manage.py process_media)
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 1))
+MEDIA_JOB_TIMEOUT = int(os.environ.get('MEDIA_JOB_TIMEOUT', 6 * 3600))
+MEDIA_JOB_ATTEMPTS = int(os.environ.get('MEDIA_JOB_ATTEMPTS', 3))
+# Качества HLS: (имя, высота кадра, битрейт видео, битрейт звука)
+HLS_RENDITIONS = (
+    ('360p', 360, '800k', '96k'),
+    ('720p', 720, '2800k', '128k'),
+)
+HLS_SEGMENT_SECONDS = 6
+
 
 
 # Password validation
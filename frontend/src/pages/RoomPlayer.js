@@ -69,8 +69,9 @@ function RoomPlayer() {
         if (roomRes.data.active_series) setActiveTab('episodes');
 
         try {
-            const messagesRes = await api.get(`messages/?room=${roomName}`);
-            const formattedMessages = messagesRes.data.map(msg => ({
+            // История приходит постранично: последние сообщения комнаты в results
+            const messagesRes = await api.get('messages/', { params: { room: roomName } });
+            const formattedMessages = messagesRes.data.results.map(msg => ({
                 username: msg.user_name,
                 message: msg.content,
                 timestamp: msg.timestamp,
@@ -380,6 +381,9 @@ function RoomPlayer() {
   if (loading) return <div className="loading">Загрузка...</div>;
 
   const videoSrc = room?.current_video_url;
+  // HLS-плейлист (нарезка готова) + исходный mp4 для браузеров, которые HLS не играют
+  const isHls = videoSrc?.endsWith('.m3u8');
+  const mp4Src = isHls ? room?.current_video_fallback_url : videoSrc;
   const posterSrc = (room?.current_poster_url && !room.current_poster_url.includes('default')) ? room.current_poster_url : null;
   const pageTitle = room?.current_title || room?.name;
   const isOwner = room?.owner_name === username;
@@ -407,7 +411,8 @@ function RoomPlayer() {
                         onSeeked={() => sendVideoEvent('seek')}
                         muted={!hasSyncedInitial.current}
                     >
-                        <source src={videoSrc} type="video/mp4" />
+                        {isHls && <source src={videoSrc} type="application/vnd.apple.mpegurl" />}
+                        {mp4Src && <source src={mp4Src} type="video/mp4" />}
                     </video>
                 ) : (
                     <div className="no-video-placeholder"><h3>🎬 Ничего не играет</h3></div>